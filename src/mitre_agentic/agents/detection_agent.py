@@ -1,18 +1,18 @@
 # data components / detection mapping agent
 from __future__ import annotations
 
+import asyncio
+import logging
+import re
 from typing import Any, Dict, List, Optional, Tuple
 
 from mitre_agentic.mcp_client import MitreMcpClient
+from mitre_agentic.utils.dictpath import safe_get
 
+logger = logging.getLogger(__name__)
 
-def _safe_get(d: Any, *path: str, default: Any = None) -> Any:
-    cur = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+
+_WS_RE = re.compile(r"\s+")
 
 
 def _extract_component_names(datacomponents_payload: Any, max_items: int) -> Tuple[List[str], int]:
@@ -27,24 +27,24 @@ def _extract_component_names(datacomponents_payload: Any, max_items: int) -> Tup
     if not isinstance(datacomponents_payload, list):
         return ([], 0)
 
+    # Walk the full list for an accurate total, but only keep (and str())
+    # the first max_items names.
     names: List[str] = []
+    append = names.append
+    total = 0
     for item in datacomponents_payload:
         if not isinstance(item, dict):
             continue
 
         obj = item.get("object")
-        if isinstance(obj, dict):
-            name = obj.get("name")
-            if name:
-                names.append(str(name))
-        else:
-            # fallback shape (rare): the item itself may be the object
-            name = item.get("name")
-            if name:
-                names.append(str(name))
+        # fallback shape (rare): the item itself may be the object
+        name = obj.get("name") if isinstance(obj, dict) else item.get("name")
+        if name:
+            total += 1
+            if total <= max_items:
+                append(str(name))
 
-    total = len(names)
-    return (names[:max_items], total)
+    return (names, total)
 
 
 def _compact_detection_text(text: Optional[str], max_chars: int = 280) -> str:
@@ -53,8 +53,8 @@ def _compact_detection_text(text: Optional[str], max_chars: int = 280) -> str:
     """
     if not text:
         return ""
-    s = " ".join(text.strip().split())
-    return s[:max_chars] + ("..." if len(s) > max_chars else "")
+    s = _WS_RE.sub(" ", text).strip()
+    return s if len(s) <= max_chars else s[:max_chars] + "..."
 
 
 async def _fallback_detection_from_technique_object(
@@ -76,8 +76,8 @@ async def _fallback_detection_from_technique_object(
 
     # Depending on your server wrapper, technique may be under result/object.
     technique_obj = (
-        _safe_get(obj_resp, "result", "object", default=None)
-        or _safe_get(obj_resp, "result", default=None)
+        safe_get(obj_resp, "result", "object", default=None)
+        or safe_get(obj_resp, "result", default=None)
         or obj_resp
     )
 
@@ -111,61 +111,103 @@ async def recommend_detection_telemetry(
     confirmed_techniques: List[Dict[str, Any]],
     domain: str = "enterprise",
     max_items: int = 8,
+    concurrency: int = 10,
 ) -> Dict[str, Any]:
     """
     Agent 4 (Detection):
     1) Try structured "data components detecting technique"
     2) If tool returns 0, fallback to technique's built-in detection guidance
        via get_object_by_stix_id (x_mitre_detection + x_mitre_data_sources).
+
+    Techniques are fetched in parallel (bounded by `concurrency`), using the
+    batch tool get_datacomponents_detecting_techniques when advertised.
     """
-    out: List[Dict[str, Any]] = []
+    # Use semaphore to limit concurrency
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    # Server supports batch lookups: one round trip for all primary calls,
+    # only the (rarer) fallbacks are issued per technique.
+    batch_by_id: Optional[Dict[str, Any]] = None
+    if await client.has_tool("get_datacomponents_detecting_techniques"):
+        stix_ids = [t["stix_id"] for t in confirmed_techniques if t.get("stix_id")]
+        batch_by_id = {}
+        if stix_ids:
+            batch_by_id = await client.call_tool_batch(
+                "get_datacomponents_detecting_techniques",
+                ids_arg="technique_stix_ids",
+                ids=stix_ids,
+                arguments={"domain": domain},
+            )
 
-    for t in confirmed_techniques:
+    async def _fetch_detection(t: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fetch detection data for one technique with concurrency limit."""
         stix_id = t.get("stix_id")
         if not stix_id:
-            continue
-
-        # --- Primary: structured data components ---
-        resp = await client.call_tool(
-            "get_datacomponents_detecting_technique",
-            {"technique_stix_id": stix_id, "domain": domain},
-        )
-
-        payload = _safe_get(resp, "result", default=None) or resp
-        count = 0
-        datacomponents = []
-
-        if isinstance(payload, dict):
-            count = int(payload.get("count") or 0)
-            datacomponents = payload.get("datacomponents") or []
+            return None
+
+        async with sem:
+            # --- Primary: structured data components ---
+            if batch_by_id is not None:
+                resp = batch_by_id.get(stix_id)
+            else:
+                resp = await client.call_tool(
+                    "get_datacomponents_detecting_technique",
+                    {"technique_stix_id": stix_id, "domain": domain},
+                )
+
+            payload = (resp.get("result") if isinstance(resp, dict) else None) or resp
+            count = 0
+            datacomponents = []
+
+            if isinstance(payload, dict):
+                count = int(payload.get("count") or 0)
+                datacomponents = payload.get("datacomponents") or []
+
+            top_names, total = _extract_component_names(datacomponents, max_items=max_items)
+
+            detection_block: Dict[str, Any] = {
+                "mode": "datacomponents",
+                "total_datacomponents": total,
+                "top_datacomponents": top_names,
+            }
 
-        top_names, total = _extract_component_names(datacomponents, max_items=max_items)
+            # --- Fallback if empty ---
+            if count == 0 or total == 0:
+                fallback = await _fallback_detection_from_technique_object(
+                    client, technique_stix_id=stix_id, domain=domain
+                )
+                detection_block = {
+                    "mode": "fallback_technique_detection",
+                    **fallback,
+                }
 
-        detection_block: Dict[str, Any] = {
-            "mode": "datacomponents",
-            "total_datacomponents": total,
-            "top_datacomponents": top_names,
+        return {
+            "technique": {
+                "id": t.get("id"),
+                "name": t.get("name"),
+                "stix_id": stix_id,
+            },
+            "detection": detection_block,
         }
 
-        # --- Fallback if empty ---
-        if count == 0 or total == 0:
-            fallback = await _fallback_detection_from_technique_object(
-                client, technique_stix_id=stix_id, domain=domain
-            )
-            detection_block = {
-                "mode": "fallback_technique_detection",
-                **fallback,
-            }
-
-        out.append(
-            {
-                "technique": {
-                    "id": t.get("id"),
-                    "name": t.get("name"),
-                    "stix_id": stix_id,
-                },
-                "detection": detection_block,
-            }
+    # Fetch all detections in parallel
+    tasks = [_fetch_detection(t) for t in confirmed_techniques]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Process results (gather preserves input order)
+    # Exceptions from gather are errors; None means the technique had no STIX ID
+    errors: List[str] = [str(r) for r in results if isinstance(r, BaseException)]
+    out: List[Dict[str, Any]] = [
+        r for r in results if r is not None and not isinstance(r, BaseException)
+    ]
+
+    # Log errors if any
+    if errors:
+        logger.warning(
+            "%d errors during detection fetching: %s",
+            len(errors),
+            errors[:3],
+            extra={"error_count": len(errors), "error_sample": errors[:3]},
         )
 
-    return {"domain": domain, "detections": out}
+    return {"domain": domain, "detections": out, "errors": errors}
@@ -1,23 +1,39 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import logging
 from typing import Any, Dict, List, Optional, Tuple
 
-from openai import AsyncOpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from pydantic import ValidationError
 
+from mitre_agentic import llm_cache
+from mitre_agentic.mcp_client import MitreMcpClient
 from mitre_agentic.schemas import DetectionLLMOutput
+from mitre_agentic.utils import jsonutil
+from mitre_agentic.utils.dictpath import safe_get
 
+logger = logging.getLogger(__name__)
+
+
+# Shared OpenAI client: keeps its connection pool (TLS, DNS, keep-alive)
+# alive across calls and pipeline runs instead of rebuilding it per call.
+_OPENAI_CLIENT: Optional[AsyncOpenAI] = None
+
+
+def _get_openai() -> AsyncOpenAI:
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        _OPENAI_CLIENT = AsyncOpenAI(
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            ),
+        )
+    return _OPENAI_CLIENT
 
-# Helpers
 
-def _safe_get(d: Any, *path: str, default: Any = None) -> Any:
-    cur = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+# Helpers
 
 
 def _truncate_list(x: Any, n: int) -> List[Any]:
@@ -29,9 +45,11 @@ def _clamp(n: int, lo: int, hi: int) -> int:
 
 
 def _truncate_str(s: Any, max_len: int) -> str:
-    if s is None:
-        return ""
-    s = str(s)
+    # Common case: already a short str -> no conversion, no allocation
+    if type(s) is not str:
+        if s is None:
+            return ""
+        s = str(s)
     return s if len(s) <= max_len else (s[: max_len - 1] + "…")
 
 
@@ -52,39 +70,80 @@ def _extract_json_object(text: str) -> str:
     return "{}"
 
 
+class _JsonObjectTracker:
+    """
+    Incrementally track the outer JSON object of a streamed completion
+    (string/escape aware), so we can stop reading as soon as it closes and
+    bail out early when the stream clearly isn't a JSON object.
+    """
+
+    __slots__ = ("depth", "in_string", "escape", "started", "done", "malformed")
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.done = False
+        self.malformed = False
+
+    def feed(self, chunk: str) -> None:
+        for ch in chunk:
+            if self.done or self.malformed:
+                return
+
+            if not self.started:
+                if ch.isspace():
+                    continue
+                if ch != "{":
+                    self.malformed = True
+                    return
+                self.started = True
+                self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+
+
 def _sanitize_llm_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Enforce schema constraints BEFORE Pydantic validation to prevent crashes:
-      - technique_id/name <= 140
+    Coerce the constraints Pydantic can't fix by itself BEFORE validation
+    (string lengths are clipped by the schema's own validators):
       - hypotheses length 1..5
-      - title <= 140
-      - telemetry list length 2..8, each item <= 140
-      - rationale <= 400
+      - telemetry list length 2..8 (padded with sensible defaults)
       - confidence in {low, medium, high}
+      - missing fields default to ""
     """
-    out: Dict[str, Any] = {}
-
-    out["technique_id"] = _truncate_str(payload.get("technique_id", ""), 140)
-    out["technique_name"] = _truncate_str(payload.get("technique_name", ""), 140)
-
     raw_h = payload.get("hypotheses", [])
     if not isinstance(raw_h, list):
         raw_h = []
 
-    raw_h = raw_h[:5]  # max 5
     cleaned_h: List[Dict[str, Any]] = []
 
-    for h in raw_h:
+    for h in raw_h[:5]:  # max 5
         if not isinstance(h, dict):
             continue
 
-        title = _truncate_str(h.get("title", ""), 140)
-
         telemetry = h.get("telemetry", [])
         if not isinstance(telemetry, list):
             telemetry = []
-        telemetry = [ _truncate_str(x, 140) for x in telemetry if x is not None ]
-        telemetry = telemetry[:8]  # max 8
+        telemetry = [x for x in telemetry if x is not None][:8]  # max 8
 
         # Ensure at least 2 telemetry items (schema expects 2..8)
         if len(telemetry) < 2:
@@ -94,17 +153,15 @@ def _sanitize_llm_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
             else:
                 telemetry.append("Endpoint process telemetry (EDR/Sysmon)")
 
-        rationale = _truncate_str(h.get("rationale", ""), 400)
-
         conf = str(h.get("confidence", "medium")).lower().strip()
         if conf not in {"low", "medium", "high"}:
             conf = "medium"
 
         cleaned_h.append(
             {
-                "title": title,
+                "title": h.get("title") or "",
                 "telemetry": telemetry,
-                "rationale": rationale,
+                "rationale": h.get("rationale") or "",
                 "confidence": conf,
             }
         )
@@ -120,12 +177,106 @@ def _sanitize_llm_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
             }
         ]
 
-    out["hypotheses"] = cleaned_h
-    return out
+    return {
+        "technique_id": payload.get("technique_id") or "",
+        "technique_name": payload.get("technique_name") or "",
+        "hypotheses": cleaned_h,
+    }
+
+
+def _parse_llm_output(raw_text: str) -> Tuple[DetectionLLMOutput, bool]:
+    """
+    Parse raw model output into DetectionLLMOutput.
+
+    Clean output is validated straight from JSON in one pass; anything else
+    (wrapped payloads, out-of-range lists, bad confidence values) goes through
+    the lenient dict path.
+
+    The flag is False when the model gave no usable hypotheses and the
+    result is only the sanitizer's placeholder (not worth caching).
+    """
+    try:
+        return DetectionLLMOutput.model_validate_json(raw_text), True
+    except ValidationError:
+        pass
+
+    # Fast path: json_object mode almost always yields a clean object,
+    # only scan for an embedded object when the direct parse fails.
+    try:
+        parsed = jsonutil.loads(raw_text)
+    except ValueError:
+        extracted = _extract_json_object(raw_text)
+        # Wrapped but otherwise clean output (fences/commentary)
+        try:
+            return DetectionLLMOutput.model_validate_json(extracted), True
+        except ValidationError:
+            pass
+        try:
+            parsed = jsonutil.loads(extracted)
+        except ValueError:
+            parsed = {}
+
+    # Some models wrap/unwrap the payload -> FTSE
+    if isinstance(parsed, dict):
+        for k in ("result", "output", "data"):
+            if isinstance(parsed.get(k), dict):
+                parsed = parsed[k]
+                break
+
+    if not isinstance(parsed, dict):
+        parsed = {}
+
+    raw_h = parsed.get("hypotheses")
+    from_model = isinstance(raw_h, list) and any(isinstance(h, dict) for h in raw_h[:5])
+
+    # Enforce shape constraints BEFORE Pydantic validation
+    sanitized = _sanitize_llm_payload(parsed)
+
+    # Validate + coerce into our schema (now safe)
+    return DetectionLLMOutput.model_validate(sanitized), from_model
 
 
 # LLM Interaction
 
+# Thanks to ed donner LLM course for prompt pattern
+_DETECTION_SYSTEM_PROMPT = (
+    "You are a senior detection engineer. "
+    "Return detection ideas that are practical, log-source oriented, and defensible. "
+    "Avoid vague advice. Focus on telemetry sources (EDR/Sysmon/Windows Event Logs/Proxy/DNS/etc). "
+    "Output MUST be valid JSON matching the provided schema."
+)
+
+_DETECTION_PROMPT_STATIC: Dict[str, Any] = {
+    "task": "Generate detection hypotheses for a MITRE ATT&CK technique when STIX detection mappings are missing.",
+    "constraints": {
+        "num_hypotheses": "1 to 5",
+        "telemetry_items_per_hypothesis": "2 to 8",
+        "title_max_len": 140,
+        "telemetry_item_max_len": 140,
+        "rationale_max_len": 400,
+        "confidence_values": ["low", "medium", "high"],
+    },
+    "schema": {
+        "technique_id": "string<=140",
+        "technique_name": "string<=140",
+        "hypotheses": [
+            {
+                "title": "string<=140",
+                "telemetry": ["string<=140", "... (2..8)"],
+                "rationale": "string<=400",
+                "confidence": "low|medium|high",
+            }
+        ],
+    },
+    "output_instructions": "Return ONLY JSON. No markdown, no extra keys.",
+}
+
+# Folded into the cache key so prompt edits invalidate old entries
+_DETECTION_PROMPT_KEY = llm_cache.cache_key(
+    _DETECTION_SYSTEM_PROMPT, jsonutil.dumps(_DETECTION_PROMPT_STATIC, sort_keys=True)
+)
+
+
 async def _llm_generate_detection_hypotheses(
     *,
     client: AsyncOpenAI,
@@ -139,79 +290,97 @@ async def _llm_generate_detection_hypotheses(
     Ask the LLM for detection hypotheses in a strict schema.
     We sanitize/truncate before Pydantic validation so the app never crashes
     on "string_too_long" errors.
+
+    Outputs are cached on disk by (prompt, technique, incident, model) for
+    llm_cache.DEFAULT_TTL; re-runs on the same incident skip the LLM entirely.
+    Truncated/malformed streams and placeholder-only results aren't cached.
     """
-    # Thanks to ed donner LLM course for prompt pattern
-    system = (
-        "You are a senior detection engineer. "
-        "Return detection ideas that are practical, log-source oriented, and defensible. "
-        "Avoid vague advice. Focus on telemetry sources (EDR/Sysmon/Windows Event Logs/Proxy/DNS/etc). "
-        "Output MUST be valid JSON matching the provided schema."
+    cache_key = llm_cache.cache_key(
+        _DETECTION_PROMPT_KEY,
+        technique_id,
+        technique_name,
+        technique_description,
+        llm_cache.normalize_text(incident_text),
+        model,
     )
-
+    cached = await asyncio.to_thread(llm_cache.get, cache_key, llm_cache.DEFAULT_TTL)
+    if cached is not None:
+        try:
+            return DetectionLLMOutput.model_validate_json(cached)
+        except ValidationError:
+            pass  # stale/corrupt entry: regenerate
+
+    # Static instructions first, per-technique/incident fields last, so the
+    # serialized prompt shares its prefix across calls (provider prompt caching)
     user = {
-        "task": "Generate detection hypotheses for a MITRE ATT&CK technique when STIX detection mappings are missing.",
+        **_DETECTION_PROMPT_STATIC,
         "technique": {
             "id": technique_id,
             "name": technique_name,
             "description": technique_description,
         },
         "incident_context": incident_text,
-        "constraints": {
-            "num_hypotheses": "1 to 5",
-            "telemetry_items_per_hypothesis": "2 to 8",
-            "title_max_len": 140,
-            "telemetry_item_max_len": 140,
-            "rationale_max_len": 400,
-            "confidence_values": ["low", "medium", "high"],
-        },
-        "schema": {
-            "technique_id": "string<=140",
-            "technique_name": "string<=140",
-            "hypotheses": [
-                {
-                    "title": "string<=140",
-                    "telemetry": ["string<=140", "... (2..8)"],
-                    "rationale": "string<=400",
-                    "confidence": "low|medium|high",
-                }
-            ],
-        },
-        "output_instructions": "Return ONLY JSON. No markdown, no extra keys.",
     }
 
-    resp = await client.chat.completions.create(
+    stream = await client.chat.completions.create(
         model=model,
         messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(user)},
+            {"role": "system", "content": _DETECTION_SYSTEM_PROMPT},
+            {"role": "user", "content": jsonutil.dumps(user)},
         ],
-        temperature=0.2,
+        temperature=0.0,
         response_format={"type": "json_object"},
+        stream=True,
     )
 
-    raw_text = resp.choices[0].message.content or "{}"
-    raw_text = _extract_json_object(raw_text)
-
+    # Accumulate deltas; stop once the outer object closes, abort if malformed
+    parts: List[str] = []
+    tracker = _JsonObjectTracker()
     try:
-        parsed = json.loads(raw_text)
-    except Exception:
-        parsed = {}
-
-    # Some models wrap/unwrap the payload -> FTSE
-    if isinstance(parsed, dict):
-        for k in ("result", "output", "data"):
-            if isinstance(parsed.get(k), dict):
-                parsed = parsed[k]
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            tracker.feed(delta)
+            if tracker.done or tracker.malformed:
                 break
+    finally:
+        await stream.close()
 
-    if not isinstance(parsed, dict):
-        parsed = {}
+    raw_text = "".join(parts) if not tracker.malformed else "{}"
 
-    # Enforce length + shape constraints BEFORE Pydantic validation
-    sanitized = _sanitize_llm_payload(parsed)
+    out, from_model = _parse_llm_output(raw_text)
+    if tracker.done and from_model:
+        await asyncio.to_thread(llm_cache.put, cache_key, out.model_dump_json())
+    return out
 
-    # Validate + coerce into our schema (now safe)
-    return DetectionLLMOutput.model_validate(sanitized)
+
+async def _fetch_descriptions(
+    client: MitreMcpClient,
+    *,
+    technique_ids: List[str],
+    domain: str,
+) -> Dict[str, str]:
+    """
+    Fetch technique descriptions on demand (mapping skips them by default).
+    Only called for the techniques that actually need the LLM fallback.
+    """
+    async def _fetch_one(tid: str) -> str:
+        resp = await client.call_tool(
+            "get_technique_by_id",
+            {"technique_id": tid, "domain": domain, "include_description": True},
+        )
+        return str(safe_get(resp, "result", "technique", "description", default="") or "")
+
+    results = await asyncio.gather(*[_fetch_one(tid) for tid in technique_ids], return_exceptions=True)
+    return {
+        tid: desc
+        for tid, desc in zip(technique_ids, results)
+        if isinstance(desc, str) and desc
+    }
 
 
 # ----------------------------
@@ -226,25 +395,34 @@ async def reason_detection_with_llm_fallback(
     incident_text: str,
     model: str = "gpt-4.1-mini",
     max_hypotheses_per_technique: int = 3, # do not overwelm the analyst
+    concurrency: int = 5, # Max parallel LLM calls (rate limits)
+    mcp_client: Optional[MitreMcpClient] = None,
+    domain: str = "enterprise",
+    analysis_budget_s: Optional[float] = 30.0, # None = no budget
 ) -> Dict[str, Any]:
     """
     Agent (Detection Reasoning, LLM fallback):
     - If STIX provides data components, keep them.
     - If STIX provides none, ask LLM for structured detection hypotheses.
-    """
-    openai_client = AsyncOpenAI()
 
-    detections = _safe_get(stix_detection_output, "detections", default=[])
-    stix_by_id: Dict[str, Dict[str, Any]] = {}
+    LLM fallbacks run in parallel (bounded by `concurrency`). When
+    `mcp_client` is given, descriptions missing from `confirmed_techniques`
+    are fetched just for the fallback subset.
+
+    The LLM phase is capped at `analysis_budget_s`; on expiry the remaining
+    calls are cancelled and the output carries "partial": True.
+    """
+    openai_client = _get_openai()
 
-    for item in detections:
-        tech = item.get("technique", {}) if isinstance(item, dict) else {}
-        det = item.get("detection", {}) if isinstance(item, dict) else {}
-        tid = tech.get("id")
-        if tid:
-            stix_by_id[str(tid)] = {"technique": tech, "detection": det}
+    detections = safe_get(stix_detection_output, "detections", default=[])
+    stix_by_id: Dict[str, Dict[str, Any]] = {
+        str(tech["id"]): {"technique": tech, "detection": item.get("detection", {})}
+        for item in detections
+        if isinstance(item, dict) and (tech := item.get("technique", {})).get("id")
+    }
 
     out: List[Dict[str, Any]] = []
+    fallback: List[Tuple[int, str, str, str]] = []  # (out index, id, name, description)
 
     for t in confirmed_techniques:
         tid = str(t.get("id") or "")
@@ -269,29 +447,92 @@ async def reason_detection_with_llm_fallback(
             )
             continue
 
-        # LLM fallback (safe + truncated)
-        llm_structured = await _llm_generate_detection_hypotheses(
-            client=openai_client,
-            technique_id=_truncate_str(tid, 140),
-            technique_name=_truncate_str(tname, 140),
-            technique_description=str(tdesc or ""),
-            incident_text=str(incident_text or ""),
-            model=model,
-        )
-
-        llm_structured.hypotheses = llm_structured.hypotheses[:max_hypotheses_per_technique]
-
+        # LLM fallback: filled in below once all calls complete
         out.append(
             {
                 "technique": {"id": tid, "name": tname, "stix_id": t.get("stix_id")},
                 "mode": "llm_fallback",
                 "stix": {"total": 0, "top_datacomponents": []},
-                "llm": llm_structured.model_dump(),
-                "note": (
-                    "STIX returned 0 data components for this technique in this release; "
-                    "LLM generated detection hypotheses using incident context."
-                ),
+                "llm": None,
             }
         )
+        fallback.append((len(out) - 1, tid, tname, tdesc))
+
+    # Lazily fetch descriptions for the fallback subset only
+    missing_desc = [tid for _, tid, _, tdesc in fallback if not tdesc]
+    if mcp_client is not None and missing_desc:
+        descriptions = await _fetch_descriptions(mcp_client, technique_ids=missing_desc, domain=domain)
+        fallback = [
+            (idx, tid, tname, tdesc or descriptions.get(tid, ""))
+            for idx, tid, tname, tdesc in fallback
+        ]
+
+    # Use semaphore to respect LLM rate limits
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _generate_with_limit(tid: str, tname: str, tdesc: str) -> DetectionLLMOutput:
+        """LLM fallback (safe + truncated) with concurrency limit."""
+        async with sem:
+            return await _llm_generate_detection_hypotheses(
+                client=openai_client,
+                technique_id=_truncate_str(tid, 140),
+                technique_name=_truncate_str(tname, 140),
+                technique_description=str(tdesc or ""),
+                incident_text=str(incident_text or ""),
+                model=model,
+            )
+
+    tasks = [
+        asyncio.ensure_future(_generate_with_limit(tid, tname, tdesc))
+        for _, tid, tname, tdesc in fallback
+    ]
+
+    # Global time budget: once it expires, cancel whatever is still running
+    # and return the hypotheses that did complete.
+    partial = False
+    if tasks:
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=analysis_budget_s)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if pending:
+            partial = True
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    errors: List[str] = []
+
+    for (idx, tid, _, _), task in zip(fallback, tasks):
+        if task.cancelled():
+            errors.append(f"{tid}: analysis budget exceeded")
+            out[idx]["note"] = "LLM fallback skipped: analysis budget exceeded."
+            continue
+
+        # Handle exceptions from the LLM call
+        exc = task.exception()
+        if exc is not None:
+            errors.append(f"{tid}: {exc}")
+            out[idx]["note"] = f"LLM fallback failed for this technique: {exc}"
+            continue
+
+        result = task.result()
+        result = result.model_copy(
+            update={"hypotheses": result.hypotheses[:max_hypotheses_per_technique]}
+        )
+        out[idx]["llm"] = result.model_dump()
+        out[idx]["note"] = (
+            "STIX returned 0 data components for this technique in this release; "
+            "LLM generated detection hypotheses using incident context."
+        )
+
+    # Log errors if any
+    if errors:
+        logger.warning(
+            "%d errors during LLM detection reasoning: %s",
+            len(errors),
+            errors[:3],
+            extra={"error_count": len(errors), "error_sample": errors[:3]},
+        )
 
-    return {"detection_reasoning": out}
+    return {"detection_reasoning": out, "errors": errors, "partial": partial}
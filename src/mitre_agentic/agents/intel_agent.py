@@ -1,17 +1,47 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
 
 from mitre_agentic.mcp_client import MitreMcpClient
+from mitre_agentic.utils.dictpath import safe_get
 
+logger = logging.getLogger(__name__)
 
-def _safe_get(d: Any, *path: str, default: Any = None) -> Any:
-    cur = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+
+def _build_intel_entry(
+    t: Dict[str, Any],
+    groups_resp: Any,
+    software_resp: Any,
+    *,
+    max_items: int,
+) -> Dict[str, Any]:
+    """Normalize groups/software responses for one technique."""
+    #let's handles schema variations without crashes--
+    groups = (
+        safe_get(groups_resp, "result", "groups", default=None)
+        or safe_get(groups_resp, "groups", default=[])
+    )
+
+    software = (
+        safe_get(software_resp, "result", "software", default=None)
+        or safe_get(software_resp, "software", default=[])
+    )
+
+    # Keep demo readable
+    groups = groups[:max_items] if isinstance(groups, list) else []
+    software = software[:max_items] if isinstance(software, list) else []
+
+    return {
+        "technique": {
+            "id": t.get("id"),
+            "name": t.get("name"),
+            "stix_id": t.get("stix_id"),
+        },
+        "groups_using_technique": groups,
+        "software_using_technique": software,
+    }
 
 
 async def enrich_with_groups_and_software(
@@ -20,59 +50,90 @@ async def enrich_with_groups_and_software(
     confirmed_techniques: List[Dict[str, Any]],
     domain: str = "enterprise",
     max_items: int = 8,
+    concurrency: int = 10,
 ) -> Dict[str, Any]:
     """
     Agent 3 (Intel):
     For each confirmed technique, pull:
       - groups that use it
       - software that uses it
-    """
-    enriched: List[Dict[str, Any]] = []
 
-    for t in confirmed_techniques:
+    Uses the batch tools when the server advertises them; otherwise both
+    lookups for a technique run concurrently, and techniques are fetched
+    in parallel (bounded by `concurrency`).
+    """
+    if await client.has_tool("get_groups_using_techniques") and await client.has_tool("get_software_using_techniques"):
+        # Server supports batch lookups: two round trips for all techniques
+        with_stix = [t for t in confirmed_techniques if t.get("stix_id")]
+        if not with_stix:
+            return {"domain": domain, "intel": [], "errors": []}
+
+        stix_ids = [t["stix_id"] for t in with_stix]
+        groups_by_id, software_by_id = await asyncio.gather(
+            client.call_tool_batch(
+                "get_groups_using_techniques",
+                ids_arg="technique_stix_ids",
+                ids=stix_ids,
+                arguments={"domain": domain},
+            ),
+            client.call_tool_batch(
+                "get_software_using_techniques",
+                ids_arg="technique_stix_ids",
+                ids=stix_ids,
+                arguments={"domain": domain},
+            ),
+        )
+        enriched = [
+            _build_intel_entry(
+                t,
+                groups_by_id.get(t["stix_id"]),
+                software_by_id.get(t["stix_id"]),
+                max_items=max_items,
+            )
+            for t in with_stix
+        ]
+        return {"domain": domain, "intel": enriched, "errors": []}
+
+    # Use semaphore to limit concurrency
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _fetch_one(t: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fetch groups + software for one technique with concurrency limit."""
         stix_id = t.get("stix_id")
         if not stix_id:
-            continue
-
-        groups_resp = await client.call_tool(
-            "get_groups_using_technique",
-            {"technique_stix_id": stix_id, "domain": domain},
+            return None
+
+        async with sem:
+            groups_resp, software_resp = await asyncio.gather(
+                client.call_tool(
+                    "get_groups_using_technique",
+                    {"technique_stix_id": stix_id, "domain": domain},
+                ),
+                client.call_tool(
+                    "get_software_using_technique",
+                    {"technique_stix_id": stix_id, "domain": domain},
+                ),
+            )
+
+        return _build_intel_entry(t, groups_resp, software_resp, max_items=max_items)
+
+    # Fetch all techniques in parallel
+    tasks = [_fetch_one(t) for t in confirmed_techniques]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Exceptions from gather are errors; None means the technique had no STIX ID
+    errors: List[str] = [str(r) for r in results if isinstance(r, BaseException)]
+    enriched: List[Dict[str, Any]] = [
+        r for r in results if r is not None and not isinstance(r, BaseException)
+    ]
+
+    # Log errors if any
+    if errors:
+        logger.warning(
+            "%d errors during intel fetching: %s",
+            len(errors),
+            errors[:3],
+            extra={"error_count": len(errors), "error_sample": errors[:3]},
         )
-        software_resp = await client.call_tool(
-            "get_software_using_technique",
-            {"technique_stix_id": stix_id, "domain": domain},
-        )
-
-        # groups = _safe_get(groups_resp, "groups", default=[])
-        # software = _safe_get(software_resp, "software", default=[])
-
-        #let's handles schema variations without crashes--
-        groups = (
-            _safe_get(groups_resp, "result", "groups", default=None)
-            or _safe_get(groups_resp, "groups", default=[])
-        )
-
-        software = (
-            _safe_get(software_resp, "result", "software", default=None)
-            or _safe_get(software_resp, "software", default=[])
-)
-
-
-        # Keep demo readable
-        groups = groups[:max_items] if isinstance(groups, list) else []
-        software = software[:max_items] if isinstance(software, list) else []
-
-        enriched.append(
-            {
-                "technique": {
-                    "id": t.get("id"),
-                    "name": t.get("name"),
-                    "stix_id": stix_id,
-                },
-                "groups_using_technique": groups,
-                "software_using_technique": software,
-            }
-        )
-
-    return {"domain": domain, "intel": enriched}
 
+    return {"domain": domain, "intel": enriched, "errors": errors}
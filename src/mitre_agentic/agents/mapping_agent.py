@@ -1,44 +1,26 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 from typing import Any, Dict, List, Optional
 
 from mitre_agentic.mcp_client import MitreMcpClient
 
+logger = logging.getLogger(__name__)
 
-def _safe_get(d: Any, *path: str, default: Any = None) -> Any:
-    """Safely navigate nested dict structure."""
-    cur = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
 
-
-async def _fetch_technique_details(
-    client: MitreMcpClient,
+def _parse_technique_detail(
+    detail: Any,
     *,
     technique_id: str,
-    domain: str,
     include_description: bool,
 ) -> Optional[Dict[str, Any]]:
     """
-    Fetch full details for a single technique including tactics.
-    
+    Parse a get_technique_by_id response into our technique dict (without tactics).
+
     Returns None if technique not found.
     """
-    # Get technique details
-    detail = await client.call_tool(
-        "get_technique_by_id",
-        {
-            "technique_id": technique_id,
-            "domain": domain,
-            "include_description": include_description,
-        },
-    )
-    
-    payload = _safe_get(detail, "result", default=detail)
+    payload = detail.get("result", detail) if isinstance(detail, dict) else detail
     
     if not isinstance(payload, dict) or not payload.get("found"):
         return None
@@ -48,30 +30,99 @@ async def _fetch_technique_details(
     if not isinstance(tech, dict):
         return None
     
-    t_id = tech.get("id") or technique_id
-    t_name = tech.get("name") or ""
-    t_stix = tech.get("stix_id")
-    t_desc = tech.get("description") if include_description else None
-    
-    # Get tactics for this technique
-    tactics_resp = await client.call_tool(
-        "get_technique_tactics",
-        {"technique_id": t_id, "domain": domain},
-    )
-    
-    tactics_payload = _safe_get(tactics_resp, "result", default=tactics_resp)
+    return {
+        "id": tech.get("id") or technique_id,
+        "name": tech.get("name") or "",
+        "stix_id": tech.get("stix_id"),
+        "description": tech.get("description") if include_description else None,
+    }
+
+
+def _parse_tactics(tactics_resp: Any) -> List[Dict[str, Any]]:
+    """Parse a get_technique_tactics response into a list of tactics."""
+    tactics_payload = tactics_resp.get("result", tactics_resp) if isinstance(tactics_resp, dict) else tactics_resp
     tactics = tactics_payload.get("tactics") if isinstance(tactics_payload, dict) else []
     
     if not isinstance(tactics, list):
         tactics = []
+    return tactics
+
+
+async def _fetch_technique_details(
+    client: MitreMcpClient,
+    *,
+    technique_id: str,
+    domain: str,
+    include_description: bool,
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch full details for a single technique including tactics.
     
-    return {
-        "id": t_id,
-        "name": t_name,
-        "stix_id": t_stix,
-        "description": t_desc,
-        "tactics": tactics,
-    }
+    Returns None if technique not found.
+    """
+    # Get technique details and tactics concurrently; tactics are keyed on the
+    # input ID so the two calls don't depend on each other.
+    detail, tactics_resp = await asyncio.gather(
+        client.call_tool(
+            "get_technique_by_id",
+            {
+                "technique_id": technique_id,
+                "domain": domain,
+                "include_description": include_description,
+            },
+        ),
+        client.call_tool(
+            "get_technique_tactics",
+            {"technique_id": technique_id, "domain": domain},
+        ),
+    )
+    
+    technique = _parse_technique_detail(
+        detail, technique_id=technique_id, include_description=include_description
+    )
+    if technique is None:
+        return None
+    
+    technique["tactics"] = _parse_tactics(tactics_resp)
+    return technique
+
+
+async def _fetch_technique_details_batch(
+    client: MitreMcpClient,
+    *,
+    technique_ids: List[str],
+    domain: str,
+    include_description: bool,
+) -> List[tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Batch variant of _fetch_technique_details: one round trip for all
+    technique details and one for all tactics, issued concurrently.
+    """
+    details, tactics_by_id = await asyncio.gather(
+        client.call_tool_batch(
+            "get_techniques_by_ids",
+            ids_arg="technique_ids",
+            ids=technique_ids,
+            arguments={"domain": domain, "include_description": include_description},
+        ),
+        client.call_tool_batch(
+            "get_techniques_tactics",
+            ids_arg="technique_ids",
+            ids=technique_ids,
+            arguments={"domain": domain},
+        ),
+    )
+    
+    results: List[tuple[str, Optional[Dict[str, Any]]]] = []
+    for tid in technique_ids:
+        technique = _parse_technique_detail(
+            details.get(tid), technique_id=tid, include_description=include_description
+        )
+        if technique is not None:
+            technique["tactics"] = _parse_tactics(tactics_by_id.get(tid))
+        results.append((tid, technique))
+    
+    return results
 
 
 async def map_techniques(
@@ -79,7 +130,7 @@ async def map_techniques(
     *,
     technique_ids: List[str],
     domain: str = "enterprise",
-    include_description: bool = True,
+    include_description: bool = False,
     concurrency: int = 10, # Max parallel requests
 ) -> Dict[str, Any]:
     """
@@ -90,11 +141,16 @@ async def map_techniques(
     - Technique details (name, STIX ID, description)
     - Associated tactics
     
+    Uses the batch tools (get_techniques_by_ids / get_techniques_tactics)
+    when the server advertises them, else one call per technique.
+    
     Args:
         client: MCP client instance
         technique_ids: List of technique IDs from triage (e.g., ["T1059.001", "T1053.005"])
         domain: ATT&CK domain (enterprise, mobile, ics)
-        include_description: Whether to fetch full descriptions
+        include_description: Whether to fetch full descriptions (off by default:
+            descriptions dominate payload size and only the LLM detection
+            fallback reads them, which fetches its own on demand)
         concurrency: Max parallel requests
     
     Returns:
@@ -123,48 +179,51 @@ async def map_techniques(
             "not_found": [],
         }
     
-    # Use semaphore to limit concurrency
-    sem = asyncio.Semaphore(concurrency)
-    
-    async def _fetch_with_limit(tid: str) -> tuple[str, Optional[Dict[str, Any]]]:
-        """Fetch technique with concurrency limit."""
-        async with sem:
-            result = await _fetch_technique_details(
-                client,
-                technique_id=tid,
-                domain=domain,
-                include_description=include_description,
-            )
-            return tid, result
+    results: List[Any]
     
-    # Fetch all techniques in parallel
-    tasks = [_fetch_with_limit(tid) for tid in technique_ids]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # Separate successful from failed
-    confirmed: List[Dict[str, Any]] = []
-    not_found: List[str] = []
-    errors: List[str] = []
-    
-    for result in results:
-        # Handle exceptions from gather
-        if isinstance(result, BaseException):  # ← Fixed: Check BaseException first
-            errors.append(str(result))
-            continue
+    if await client.has_tool("get_techniques_by_ids") and await client.has_tool("get_techniques_tactics"):
+        # Server supports batch lookups: O(1) round trips
+        results = await _fetch_technique_details_batch(
+            client,
+            technique_ids=technique_ids,
+            domain=domain,
+            include_description=include_description,
+        )
+    else:
+        # Use semaphore to limit concurrency
+        sem = asyncio.Semaphore(concurrency)
         
-        # Now result as tuple[str, Optional[Dict]]
-        tid, technique = result
+        async def _fetch_with_limit(tid: str) -> tuple[str, Optional[Dict[str, Any]]]:
+            """Fetch technique with concurrency limit."""
+            async with sem:
+                result = await _fetch_technique_details(
+                    client,
+                    technique_id=tid,
+                    domain=domain,
+                    include_description=include_description,
+                )
+                return tid, result
         
-        if technique is None:
-            not_found.append(tid)
-        else:
-            confirmed.append(technique)
+        # Fetch all techniques in parallel
+        tasks = [_fetch_with_limit(tid) for tid in technique_ids]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Separate successful from failed
+    # Exceptions from gather are errors; the rest are tuple[str, Optional[Dict]]
+    errors: List[str] = [str(r) for r in results if isinstance(r, BaseException)]
+    fetched = [r for r in results if not isinstance(r, BaseException)]
+    
+    confirmed: List[Dict[str, Any]] = [tech for _, tech in fetched if tech is not None]
+    not_found: List[str] = [tid for tid, tech in fetched if tech is None]
     
     # Log errors
     if errors:
-        print(f"{len(errors)} errors during technique fetching:")
-        for err in errors[:3]:  # Show first 3
-            print(f"   - {err}")
+        logger.warning(
+            "%d errors during technique fetching: %s",
+            len(errors),
+            errors[:3],
+            extra={"error_count": len(errors), "error_sample": errors[:3]},
+        )
     
     return {
         "domain": domain,
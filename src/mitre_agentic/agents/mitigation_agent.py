@@ -1,19 +1,12 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 from typing import Any, Dict, List, Optional
 
 from mitre_agentic.mcp_client import MitreMcpClient
 
-
-def _safe_get(d: Any, *path: str, default: Any = None) -> Any:
-    """Safely navigate nested dict structure."""
-    cur = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+logger = logging.getLogger(__name__)
 
 
 async def _fetch_mitigations_for_technique(
@@ -41,7 +34,22 @@ async def _fetch_mitigations_for_technique(
         },
     )
 
-    payload = _safe_get(resp, "result", default=resp)
+    return _build_mitigations_entry(technique, resp, include_description=include_description)
+
+
+def _build_mitigations_entry(
+    technique: Dict[str, Any],
+    resp: Any,
+    *,
+    include_description: bool,
+) -> Optional[Dict[str, Any]]:
+    """
+    Normalize a get_mitigations_mitigating_technique response for one technique.
+
+    Returns None if the response can't be parsed.
+    """
+    stix_id = technique.get("stix_id")
+    payload = resp.get("result", resp) if isinstance(resp, dict) else resp
     if not isinstance(payload, dict):
         return None
 
@@ -135,38 +143,49 @@ async def enrich_with_mitigations(
             "summary": {"total_techniques": 0, "with_mitigations": 0, "total_mitigations": 0},
         }
 
-    # Use semaphore to limit concurrency
-    sem = asyncio.Semaphore(max(1, concurrency))
-
-    async def _fetch_with_limit(t: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Fetch mitigations with concurrency limit."""
-        async with sem:
-            return await _fetch_mitigations_for_technique(
-                client,
-                technique=t,
-                domain=domain,
-                include_description=include_description,
+    results: List[Any]
+
+    if await client.has_tool("get_mitigations_mitigating_techniques"):
+        # Server supports batch lookups: one round trip for all techniques
+        with_stix = [t for t in confirmed_techniques if t.get("stix_id")]
+        by_stix_id: Dict[str, Any] = {}
+        if with_stix:
+            by_stix_id = await client.call_tool_batch(
+                "get_mitigations_mitigating_techniques",
+                ids_arg="technique_stix_ids",
+                ids=[t["stix_id"] for t in with_stix],
+                arguments={"domain": domain, "include_description": include_description},
             )
-
-    # Fetch all mitigations in parallel
-    tasks = [_fetch_with_limit(t) for t in confirmed_techniques]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+        results = [
+            _build_mitigations_entry(
+                t, by_stix_id.get(t["stix_id"]), include_description=include_description
+            )
+            for t in with_stix
+        ]
+    else:
+        # Use semaphore to limit concurrency
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def _fetch_with_limit(t: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            """Fetch mitigations with concurrency limit."""
+            async with sem:
+                return await _fetch_mitigations_for_technique(
+                    client,
+                    technique=t,
+                    domain=domain,
+                    include_description=include_description,
+                )
+
+        # Fetch all mitigations in parallel
+        tasks = [_fetch_with_limit(t) for t in confirmed_techniques]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
 
     # Process results
-    out: List[Dict[str, Any]] = []
-    errors: List[str] = []
-
-    for result in results:
-        # Handle exceptions from gather
-        if isinstance(result, BaseException):
-            errors.append(str(result))
-            continue
-
-        # Handle None results (technique had no STIX ID)
-        if result is None:
-            continue
-
-        out.append(result)
+    # Exceptions from gather are errors; None means the technique had no STIX ID
+    errors: List[str] = [str(r) for r in results if isinstance(r, BaseException)]
+    out: List[Dict[str, Any]] = [
+        r for r in results if r is not None and not isinstance(r, BaseException)
+    ]
 
     # Calculate summary statistics
     total_mitigations = sum(item.get("count", 0) for item in out)
@@ -174,9 +193,12 @@ async def enrich_with_mitigations(
 
     # Log errors if any
     if errors:
-        print(f"{len(errors)} errors during mitigation fetching:")
-        for err in errors[:3]:  # Show first 3
-            print(f"   - {err}")
+        logger.warning(
+            "%d errors during mitigation fetching: %s",
+            len(errors),
+            errors[:3],
+            extra={"error_count": len(errors), "error_sample": errors[:3]},
+        )
 
     return {
         "domain": domain,
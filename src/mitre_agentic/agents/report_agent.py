@@ -1,28 +1,122 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
+import importlib.util
+import logging
 import os
+import random
 import re
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import httpx
 from dotenv import load_dotenv
+from pydantic import ValidationError
 
+from mitre_agentic import llm_cache
 from mitre_agentic.schemas import IncidentExecutiveReport
+from mitre_agentic.utils import jsonutil
+from mitre_agentic.utils.llmschema import json_schema_response_format
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # (gpt-4.1-mini, gpt-4o-mini, etc.)
-DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+DEFAULT_MODEL = "gpt-4.1-mini"
+
+# Tagged into the report context so cached prompts/responses don't carry over
+# across ATT&CK data upgrades.
+ATTACK_VERSION = os.getenv("ATTACK_VERSION", "unknown")
 
+_MAX_DESCRIPTION_CHARS = 400
 
-def _safe(obj: Any, *path: str, default=None):
-    cur = obj
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+# Shared HTTP client: one TLS handshake to api.openai.com per process instead
+# of one per report. HTTP/2 only when `h2` is installed (httpx[http2]).
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=90,
+        )
+    return _HTTP_CLIENT
+
+
+async def aclose_http_client() -> None:
+    """Close the shared report HTTP client (call once at shutdown)."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        await _HTTP_CLIENT.aclose()
+        _HTTP_CLIENT = None
+
+# Static system prompt + schema spec. Kept byte-identical across calls (no
+# interpolation) and placed ahead of the per-incident context so provider-side
+# prompt caching can reuse the whole prefix.
+_REPORT_SYSTEM_PROMPT = (
+    "You are a senior Incident Response lead writing an executive report.\n"
+    "Use ONLY the provided structured context.\n"
+    "Return ONLY valid JSON (no code fences) matching the required schema.\n"
+    "Be specific and actionable. Do NOT invent facts.\n"
+    "If something is unknown, write 'unknown'.\n\n"
+    "Write an executive incident report from the CONTEXT JSON in the next message.\n\n"
+    "Schema fields (must include all):\n"
+    "- title (<=140)\n"
+    "- executive_summary (<=900)\n"
+    "- likely_attack_flow (3-12 bullet lines)\n"
+    "- mapped_techniques (1-20 lines)\n"
+    "- notable_groups_software (0-30 lines)\n"
+    "- detection_recommendations (3-20 lines)\n"
+    "- immediate_actions (3-15 lines)\n"
+    "- iocs: { suspected_artifacts[], suspicious_processes[], suspicious_network[] }\n"
+    "- navigator_layer_path (string or null)\n"
+    "- markdown (full report in Markdown, <=12000)"
+)
+
+# Structured outputs: the API enforces the schema, so replies are bare JSON.
+_REPORT_RESPONSE_FORMAT = json_schema_response_format(IncidentExecutiveReport)
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL | re.IGNORECASE)
+
+
+def _find_json_span(s: str) -> Optional[Tuple[int, int]]:
+    """
+    Single forward scan for the first balanced {...} / [...] value.
+    Tracks bracket depth and string/escape state so braces inside JSON
+    strings don't count. Returns (start, end) for slicing, or None if no
+    opening bracket is found or the value never closes.
+    """
+    start = -1
+    depth = 0
+    in_str = False
+    escaped = False
+    for i, ch in enumerate(s):
+        if start == -1:
+            if ch == "{" or ch == "[":
+                start = i
+                depth = 1
+            continue
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{" or ch == "[":
+            depth += 1
+        elif ch == "}" or ch == "]":
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+    return None
 
 
 def _extract_json_text(raw: str) -> str:
@@ -38,11 +132,23 @@ def _extract_json_text(raw: str) -> str:
         return raw
 
     s = raw.strip()
+    if not s:
+        return s
+
+    # Fast path: already a bare JSON value (the norm with structured outputs)
+    if s[0] in "{[" and s[-1] in "}]":
+        return s
 
-    fence = re.match(r"^```(?:json)?\s*(.*?)\s*```$", s, flags=re.DOTALL | re.IGNORECASE)
-    if fence:
-        s = fence.group(1).strip()
+    if s[0] not in "{[":
+        fence = _FENCE_RE.match(s)
+        if fence:
+            s = fence.group(1).strip()
 
+    span = _find_json_span(s)
+    if span is not None:
+        return s[span[0] : span[1]]
+
+    # Unbalanced (e.g. truncated output): keep the old best-effort slice
     obj_start = s.find("{")
     arr_start = s.find("[")
     if obj_start == -1 and arr_start == -1:
@@ -50,17 +156,10 @@ def _extract_json_text(raw: str) -> str:
 
     start = min([i for i in [obj_start, arr_start] if i != -1])
     candidate = s[start:].strip()
-
-    try:
-        json.loads(candidate)
-        return candidate
-    except Exception:
-        last_obj = candidate.rfind("}")
-        last_arr = candidate.rfind("]")
-        end = max(last_obj, last_arr)
-        if end != -1:
-            return candidate[: end + 1].strip()
-        return candidate
+    end = max(candidate.rfind("}"), candidate.rfind("]"))
+    if end != -1:
+        return candidate[: end + 1].strip()
+    return candidate
 
 
 def _compact_techniques(confirmed: List[Dict[str, Any]]) -> List[str]:
@@ -82,6 +181,21 @@ def _compact_techniques(confirmed: List[Dict[str, Any]]) -> List[str]:
     return out[:20]
 
 
+def _by_technique_id(items: Any) -> List[Any]:
+    """
+    Items ({"technique": {"id": ...}, ...}) sorted by technique ID, so the
+    prompt context doesn't depend on the order upstream agents produced them.
+    """
+    if not isinstance(items, list):
+        return []
+
+    def _key(item: Any) -> str:
+        tech = item.get("technique") if isinstance(item, dict) else None
+        return str(tech.get("id") or "") if isinstance(tech, dict) else ""
+
+    return sorted(items, key=_key)
+
+
 def _compact_intel(intel: Dict[str, Any], max_items: int = 12) -> List[str]:
     """
     Compact intel agent data into readable lines for LLM context.
@@ -89,9 +203,7 @@ def _compact_intel(intel: Dict[str, Any], max_items: int = 12) -> List[str]:
       "T1055 Process Injection: Groups=APT28, FIN7 | Software=Cobalt Strike, Empire"
     """
     lines: List[str] = []
-    intel_items = (intel or {}).get("intel", [])
-    if not isinstance(intel_items, list):
-        return lines
+    intel_items = _by_technique_id((intel or {}).get("intel", []))
 
     for item in intel_items[:max_items]:
         if not isinstance(item, dict):
@@ -135,7 +247,7 @@ def _compact_detections(
     as context to the report writer.
     """
     stix_rows: List[Dict[str, Any]] = []
-    for item in (detections or {}).get("detections", []):
+    for item in _by_technique_id((detections or {}).get("detections", [])):
         tech = item.get("technique", {}) if isinstance(item, dict) else {}
         det = item.get("detection", {}) if isinstance(item, dict) else {}
 
@@ -152,7 +264,7 @@ def _compact_detections(
     llm_rows: List[Any] = []
     if isinstance(reasoning, dict):
         if "llm_detections" in reasoning:
-            llm_rows = reasoning.get("llm_detections") or []
+            llm_rows = _by_technique_id(reasoning.get("llm_detections") or [])
         elif "hypotheses" in reasoning:
             llm_rows = reasoning.get("hypotheses") or []
 
@@ -168,9 +280,7 @@ def _compact_mitigations(mitigations_ctx: Dict[str, Any], max_per_technique: int
       - structured lines per technique (names/ids)
       - and the raw 'formatted' block as fallback reference (but clipped)
     """
-    items = (mitigations_ctx or {}).get("mitigations", [])
-    if not isinstance(items, list):
-        items = []
+    items = _by_technique_id((mitigations_ctx or {}).get("mitigations", []))
 
     structured: List[Dict[str, Any]] = []
     formatted_by_tech: List[Dict[str, str]] = []
@@ -222,6 +332,60 @@ def _compact_mitigations(mitigations_ctx: Dict[str, Any], max_per_technique: int
     return {"structured": structured, "formatted": formatted_by_tech}
 
 
+# Content-addressed memo of serialized _compact_* output: re-running only the
+# report on the same pipeline outputs skips both the dict walk and the dump.
+_COMPONENT_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_COMPONENT_CACHE_SIZE = 64
+_COMPONENT_CACHE_MAX_BYTES = 1_000_000
+
+
+def _component_json(fn: Callable[..., Any], *args: Any) -> str:
+    """Compact, key-sorted JSON of fn(*args), cached on a hash of the inputs."""
+    payload = jsonutil.dumps([fn.__name__, args], sort_keys=True).encode("utf-8")
+    if len(payload) > _COMPONENT_CACHE_MAX_BYTES:
+        return jsonutil.dumps(fn(*args), sort_keys=True)
+
+    key = hashlib.blake2b(payload, digest_size=16).digest()
+    hit = _COMPONENT_CACHE.get(key)
+    if hit is not None:
+        _COMPONENT_CACHE.move_to_end(key)
+        return hit
+
+    text = jsonutil.dumps(fn(*args), sort_keys=True)
+    _COMPONENT_CACHE[key] = text
+    if len(_COMPONENT_CACHE) > _COMPONENT_CACHE_SIZE:
+        _COMPONENT_CACHE.popitem(last=False)
+    return text
+
+
+# Transient statuses / transport failures worth retrying; Retry-After
+# (seconds) wins when present.
+_RETRY_STATUSES = frozenset({429, 500, 502, 503})
+_RETRY_EXCEPTIONS = (httpx.TransportError, httpx.TimeoutException)
+_MAX_ATTEMPTS = 5
+_MAX_RETRY_DELAY = 60.0
+
+
+def _retry_delay(resp: Optional[httpx.Response], attempt: int) -> float:
+    delay = 0.0
+    if resp is not None:
+        try:
+            delay = float(resp.headers.get("Retry-After", 0))
+        except ValueError:  # HTTP-date form
+            delay = 0.0
+    if delay <= 0:
+        delay = 2**attempt + random.random()
+    return min(delay, _MAX_RETRY_DELAY)
+
+
+def _parse_report(content: str) -> IncidentExecutiveReport:
+    try:
+        return IncidentExecutiveReport.model_validate_json(content)
+    except ValidationError:
+        # Last resort for wrapped output (fences/commentary)
+        return IncidentExecutiveReport.model_validate_json(_extract_json_text(content))
+
+
 async def write_executive_report_llm(
     *,
     incident_text: str,
@@ -232,68 +396,125 @@ async def write_executive_report_llm(
     mitigations: Optional[Dict[str, Any]] = None,
     detection_reasoning: Optional[Dict[str, Any]] = None,
     navigator_layer_path: Optional[str] = None,
-    model: str = DEFAULT_MODEL,
+    model: Optional[str] = None,
+    temperature: float = 0.0,
 ) -> Dict[str, Any]:
     """
     Agent (Reporting):
     LLM writes a full executive report as JSON (validated by IncidentExecutiveReport),
     then returns {"report": <validated dict>}.
+
+    temperature defaults to 0 so repeated runs are reproducible (and hit
+    llm_cache); pass a higher value explicitly if you want varied output.
+    The model is read from OPENAI_MODEL at call time.
     """
+    model = model or os.getenv("OPENAI_MODEL", DEFAULT_MODEL)
     api_key = os.getenv("OPENAI_API_KEY", "")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is not set. Add it to .env")
 
-    context = {
-        "incident_text": incident_text,
-        "triage_summary": triage_summary,
-        "mapped_techniques": _compact_techniques(confirmed_techniques),
-        "intel_summary": _compact_intel(intel),
-        "detection_context": _compact_detections(detections, detection_reasoning),
-        "mitigations_context": _compact_mitigations(mitigations or {}),
-        "navigator_layer_path": navigator_layer_path,
-    }
-
-    system = (
-        "You are a senior Incident Response lead writing an executive report.\n"
-        "Use ONLY the provided structured context.\n"
-        "Return ONLY valid JSON (no code fences) matching the required schema.\n"
-        "Be specific and actionable. Do NOT invent facts.\n"
-        "If something is unknown, write 'unknown'."
+    # Stable order and bounded descriptions keep the serialized context (and
+    # the content-hash memo keys) from drifting with upstream ordering/edits.
+    techniques = sorted(
+        (
+            {**t, "description": t["description"][:_MAX_DESCRIPTION_CHARS]}
+            if isinstance(t.get("description"), str)
+            else t
+            for t in confirmed_techniques or []
+            if isinstance(t, dict)
+        ),
+        key=lambda t: str(t.get("id", "")),
     )
 
-    user = (
-        "Write an executive incident report from this context.\n\n"
-        "Schema fields (must include all):\n"
-        "- title (<=140)\n"
-        "- executive_summary (<=900)\n"
-        "- likely_attack_flow (3-12 bullet lines)\n"
-        "- mapped_techniques (1-20 lines)\n"
-        "- notable_groups_software (0-30 lines)\n"
-        "- detection_recommendations (3-20 lines)\n"
-        "- immediate_actions (3-15 lines)\n"
-        "- iocs: { suspected_artifacts[], suspicious_processes[], suspicious_network[] }\n"
-        "- navigator_layer_path (string or null)\n"
-        "- markdown (full report in Markdown, <=12000)\n\n"
-        f"CONTEXT JSON:\n{json.dumps(context, indent=2)}"
+    # Pre-serialized blocks in a fixed (alphabetical) key order: byte-identical
+    # to dumping the whole dict with sort_keys, but unchanged components come
+    # straight from the cache.
+    blocks = [
+        ("attack_version", jsonutil.dumps(ATTACK_VERSION)),
+        ("detection_context", _component_json(_compact_detections, detections, detection_reasoning)),
+        ("incident_text", jsonutil.dumps(incident_text)),
+        ("intel_summary", _component_json(_compact_intel, intel)),
+        ("mapped_techniques", _component_json(_compact_techniques, techniques)),
+        ("mitigations_context", _component_json(_compact_mitigations, mitigations or {})),
+        ("navigator_layer_path", jsonutil.dumps(navigator_layer_path)),
+        ("triage_summary", jsonutil.dumps(triage_summary)),
+    ]
+    context_json = "{" + ",".join(f'"{name}":{text}' for name, text in blocks) + "}"
+    user = f"CONTEXT JSON:\n{context_json}"
+
+    messages = [
+        {"role": "system", "content": _REPORT_SYSTEM_PROMPT},
+        {"role": "user", "content": user},
+    ]
+    response_format = _REPORT_RESPONSE_FORMAT
+
+    async def _call() -> str:
+        # SSE stream: accumulate deltas as they arrive instead of waiting for
+        # the whole body (the markdown field alone can be ~12k chars).
+        for attempt in range(_MAX_ATTEMPTS):
+            last = attempt + 1 >= _MAX_ATTEMPTS
+            parts: List[str] = []
+            delay: Optional[float] = None
+            try:
+                async with _get_client().stream(
+                    "POST",
+                    "https://api.openai.com/v1/chat/completions",
+                    headers={"Authorization": f"Bearer {api_key}"},
+                    json={
+                        "model": model,
+                        "messages": messages,
+                        "temperature": temperature,
+                        "response_format": response_format,
+                        "stream": True,
+                    },
+                ) as resp:
+                    if resp.status_code in _RETRY_STATUSES and not last:
+                        delay = _retry_delay(resp, attempt)
+                        reason = f"HTTP {resp.status_code}"
+                    else:
+                        if resp.is_error:
+                            await resp.aread()
+                            resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if not line.startswith("data: "):
+                                continue
+                            chunk = line[6:]
+                            if chunk == "[DONE]":
+                                break
+                            choices = jsonutil.loads(chunk).get("choices") or []
+                            if choices:
+                                delta = choices[0].get("delta") or {}
+                                parts.append(delta.get("content") or "")
+            except _RETRY_EXCEPTIONS as e:
+                if last:
+                    raise
+                delay = _retry_delay(None, attempt)
+                reason = type(e).__name__
+
+            if delay is None:
+                return "".join(parts)
+
+            # Back off with the response closed, so its pooled connection is
+            # free for other requests in the meantime
+            logger.warning(
+                "Report LLM call failed (%s); retrying in %.1fs (attempt %d/%d)",
+                reason,
+                delay,
+                attempt + 1,
+                _MAX_ATTEMPTS,
+            )
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    # Same context, but with whitespace-normalized incident text, so
+    # formatting-only differences in the pasted alert still hit the cache
+    key_blocks = [
+        (name, llm_cache.normalize_text(incident_text) if name == "incident_text" else text)
+        for name, text in blocks
+    ]
+    report = await llm_cache.cached_chat(
+        _call,
+        key_parts=(model, _REPORT_SYSTEM_PROMPT, key_blocks, temperature, response_format),
+        parse=_parse_report,
     )
-
-    async with httpx.AsyncClient(timeout=90) as client:
-        resp = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={"Authorization": f"Bearer {api_key}"},
-            json={
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
-                "temperature": 0.2,
-            },
-        )
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
-
-    content = _extract_json_text(content)
-
-    report = IncidentExecutiveReport.model_validate_json(content)
     return {"report": report.model_dump()}
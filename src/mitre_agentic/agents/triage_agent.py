@@ -1,12 +1,30 @@
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List
+import os
+from typing import Any, Dict, List, Optional
 
 from openai import AsyncOpenAI
 from pydantic import BaseModel, Field, ValidationError
 
+from mitre_agentic import llm_cache
 from mitre_agentic.schemas import TriageInput, TriageOutput, TriagePlanStep
+from mitre_agentic.utils import jsonutil
+from mitre_agentic.utils.llmschema import json_schema_response_format
+
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Shared OpenAI client so repeated triage calls reuse its connection pool.
+# The SDK already retries 429/5xx honoring Retry-After; allow 5 attempts
+# total to match the report agent.
+_OPENAI_CLIENT: Optional[AsyncOpenAI] = None
+
+
+def _get_openai() -> AsyncOpenAI:
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        _OPENAI_CLIENT = AsyncOpenAI(max_retries=4)
+    return _OPENAI_CLIENT
 
 
 class _TriageLLMOut(BaseModel):
@@ -21,27 +39,27 @@ class _TriageLLMOut(BaseModel):
     keywords: List[str] = Field(default_factory=list, max_length=20)
 
 
-def _safe_get(d: Any, *path: str, default: Any = None) -> Any:
-    cur = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+# technique_evidence is an open-keyed map, which strict mode can't express
+_TRIAGE_RESPONSE_FORMAT = json_schema_response_format(_TriageLLMOut, strict=False)
 
 
 def _dedupe_str_list(xs: List[str], max_items: int) -> List[str]:
     out: List[str] = []
     seen = set()
+    # Bound methods hoisted out of the loop
+    append = out.append
+    add = seen.add
     for x in xs:
-        s = (x or "").strip()
+        if not x:
+            continue
+        s = x.strip()
         if not s:
             continue
-        k = s.lower()
+        k = s.casefold()
         if k in seen:
             continue
-        seen.add(k)
-        out.append(s)
+        add(k)
+        append(s)
         if len(out) >= max_items:
             break
     return out
@@ -56,59 +74,120 @@ def _dedupe_technique_evidence(m: Dict[str, List[str]], max_evidence_per_tech: i
     return out
 
 
+_TRIAGE_SYSTEM_PROMPT = (
+    "You are a SOC triage analyst specialized in mapping EDR alerts to MITRE ATT&CK. "
+    "Identify all attack patterns and extract ATT&CK technique IDs *when confident* (Txxxx or Txxxx.xxx). "
+    "For each technique, provide short evidence phrases copied/paraphrased from the incident text "
+    "(e.g., process names, flags like -EncodedCommand, scheduled task creation, rundll32). "
+    "Return ONLY valid JSON."
+)
+
+_TRIAGE_OUTPUT_CONTRACT: Dict[str, Any] = {
+    "summary": "string (<=600 chars)",
+    "suspected_behaviors": ["string"],
+    "candidate_platforms": ["Windows|Linux|macOS|Cloud|Network|Other"],
+    "technique_evidence": {
+        "Txxxx or Txxxx.xxx": ["evidence phrase 1", "evidence phrase 2"]
+    },
+    "keywords": ["optional short tokens for display only"],
+}
+
+_TRIAGE_RULES: List[str] = [
+    "Only include technique IDs that look valid: start with 'T' followed by digits; optional .xxx subtechnique.",
+    "Evidence phrases must be short and concrete (<=80 chars each).",
+    "Include up to ~10 techniques, that map to the identified patterns, ordered by likelihood.",
+]
+
+# Incident texts shorter than this skip the LLM call entirely.
+_MIN_INCIDENT_CHARS = 20
+
+_DEFAULT_PLAN: List[TriagePlanStep] = [
+    TriagePlanStep(
+        step=1,
+        actor="mapping_agent",
+        intent="Confirm technique details and tactics for top-K candidate techniques.",
+        suggested_tools=["get_technique_by_id", "get_technique_tactics"],
+        notes="Use top-K technique IDs from triage technique_evidence; confirm with MCP.",
+    ),
+    TriagePlanStep(
+        step=2,
+        actor="intel_agent",
+        intent="Find threat groups and software associated with confirmed techniques.",
+        suggested_tools=["get_groups_using_technique", "get_software_using_technique"],
+        notes="Reverse lookups using technique STIX IDs.",
+    ),
+    TriagePlanStep(
+        step=3,
+        actor="detection_agent",
+        intent="Pull STIX data components (if present) and then LLM fallback when missing.",
+        suggested_tools=["get_datacomponents_detecting_technique"],
+        notes="Router decides if Agent 5 runs for missing detection mappings.",
+    ),
+]
+
+
 async def triage_incident(
     payload: TriageInput,
     *,
-    model: str = "gpt-4.1-mini",
+    model: Optional[str] = None,
+    temperature: float = 0.0,
 ) -> TriageOutput:
     """
     Agent 1 (Triage, LLM):
     - Extract candidate MITRE technique IDs + evidence phrases from raw incident text.
     - Produce a plan for subsequent agents.
+
+    temperature defaults to 0 so repeated runs are reproducible (and hit
+    llm_cache); pass a higher value explicitly if you want varied output.
+    The model is read from MITRE_TRIAGE_MODEL at call time, after the app
+    has loaded .env.
     """
+    model = model or os.getenv("MITRE_TRIAGE_MODEL", DEFAULT_MODEL)
     text = payload.incident_text.strip()
-    client = AsyncOpenAI()
-
-    system = (
-        "You are a SOC triage analyst specialized in mapping EDR alerts to MITRE ATT&CK. "
-        "Identify all attack patterns and extract ATT&CK technique IDs *when confident* (Txxxx or Txxxx.xxx). "
-        "For each technique, provide short evidence phrases copied/paraphrased from the incident text "
-        "(e.g., process names, flags like -EncodedCommand, scheduled task creation, rundll32). "
-        "Return ONLY valid JSON."
-    )
+    if len(text) < _MIN_INCIDENT_CHARS:
+        return TriageOutput(
+            summary="No substantive incident text provided.",
+            suspected_behaviors=[],
+            keywords=[],
+            candidate_platforms=["Windows"],
+            plan=list(_DEFAULT_PLAN),
+            technique_evidence={},
+        )
 
+    client = _get_openai()
+
+    # Static fields first and the incident last, so the serialized prompt
+    # shares the longest possible prefix across runs (provider prompt caching)
     user = {
+        "output_contract": _TRIAGE_OUTPUT_CONTRACT,
+        "rules": _TRIAGE_RULES,
         "incident_text": text,
-        "output_contract": {
-            "summary": "string (<=600 chars)",
-            "suspected_behaviors": ["string"],
-            "candidate_platforms": ["Windows|Linux|macOS|Cloud|Network|Other"],
-            "technique_evidence": {
-                "Txxxx or Txxxx.xxx": ["evidence phrase 1", "evidence phrase 2"]
-            },
-            "keywords": ["optional short tokens for display only"],
-        },
-        "rules": [
-            "Only include technique IDs that look valid: start with 'T' followed by digits; optional .xxx subtechnique.",
-            "Evidence phrases must be short and concrete (<=80 chars each).",
-            "Include up to ~10 techniques, that map to the identified patterns, ordered by likelihood.",
-        ],
     }
 
-    resp = await client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(user)},
-        ],
-        temperature=0.2,
-        response_format={"type": "json_object"},
-    )
-
-    raw = resp.choices[0].message.content or "{}"
+    messages = [
+        {"role": "system", "content": _TRIAGE_SYSTEM_PROMPT},
+        {"role": "user", "content": jsonutil.dumps(user)},
+    ]
+    response_format = _TRIAGE_RESPONSE_FORMAT
+
+    async def _call() -> str:
+        resp = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            response_format=response_format,
+        )
+        return resp.choices[0].message.content or "{}"
 
+    # Key on whitespace-normalized incident text so re-pasted alerts that
+    # only differ in formatting reuse the cached triage
+    key_user = {**user, "incident_text": llm_cache.normalize_text(text)}
     try:
-        parsed = _TriageLLMOut.model_validate_json(raw)
+        parsed = await llm_cache.cached_chat(
+            _call,
+            key_parts=(model, _TRIAGE_SYSTEM_PROMPT, key_user, temperature, response_format),
+            parse=_TriageLLMOut.model_validate_json,
+        )
     except ValidationError:
         # Safe fallback
         parsed = _TriageLLMOut(
@@ -124,35 +203,11 @@ async def triage_incident(
     suspected = _dedupe_str_list(parsed.suspected_behaviors, 12)
     platforms = _dedupe_str_list(parsed.candidate_platforms, 5) or ["Windows"]
 
-    plan = [
-        TriagePlanStep(
-            step=1,
-            actor="mapping_agent",
-            intent="Confirm technique details and tactics for top-K candidate techniques.",
-            suggested_tools=["get_technique_by_id", "get_technique_tactics"],
-            notes="Use top-K technique IDs from triage technique_evidence; confirm with MCP.",
-        ),
-        TriagePlanStep(
-            step=2,
-            actor="intel_agent",
-            intent="Find threat groups and software associated with confirmed techniques.",
-            suggested_tools=["get_groups_using_technique", "get_software_using_technique"],
-            notes="Reverse lookups using technique STIX IDs.",
-        ),
-        TriagePlanStep(
-            step=3,
-            actor="detection_agent",
-            intent="Pull STIX data components (if present) and then LLM fallback when missing.",
-            suggested_tools=["get_datacomponents_detecting_technique"],
-            notes="Router decides if Agent 5 runs for missing detection mappings.",
-        ),
-    ]
-
     return TriageOutput(
         summary=parsed.summary,
         suspected_behaviors=suspected,
         keywords=keywords,
         candidate_platforms=platforms,
-        plan=plan,
+        plan=list(_DEFAULT_PLAN),
         technique_evidence=technique_evidence,
     )
@@ -1,20 +1,12 @@
 # layer generation + report assemblyfrom __future__ import annotations
 
-import json
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from mitre_agentic.mcp_client import MitreMcpClient
-
-
-def _safe_get(d: Any, *path: str, default: Any = None) -> Any:
-    cur = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+from mitre_agentic.utils import jsonutil
+from mitre_agentic.utils.dictpath import safe_get
 
 
 def _now_iso() -> str:
@@ -96,7 +88,7 @@ async def build_navigator_layer_from_techniques(
     """
     # Get ATT&CK version from MCP server
     stats_resp = await client.call_tool("get_data_stats", {})
-    stats = _safe_get(stats_resp, "result", default={})
+    stats = safe_get(stats_resp, "result", default={})
     
     attack_version = stats.get("version", "18")
     if isinstance(attack_version, str) and "." in attack_version:
@@ -220,5 +212,5 @@ def save_layer_json(layer: Dict[str, Any], out_path: str | Path) -> Path:
     """
     out_path = Path(out_path).expanduser()
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(layer, indent=2, ensure_ascii=False))
+    out_path.write_text(jsonutil.dumps(layer, indent=True), encoding="utf-8")
     return out_path
@@ -1,4 +1,6 @@
 import asyncio
+import logging
+from pathlib import Path
 
 from dotenv import load_dotenv
 import os
@@ -7,13 +9,15 @@ from mitre_agentic.schemas import TriageInput
 from mitre_agentic.agents.triage_agent import triage_incident
 
 from mitre_agentic.mcp_client import MitreMcpClient
+from mitre_agentic.utils import aio
 from mitre_agentic.agents.mapping_agent import map_techniques
 from mitre_agentic.agents.intel_agent import enrich_with_groups_and_software
 from mitre_agentic.agents.detection_agent import recommend_detection_telemetry
 from mitre_agentic.agents.detection_reasoning_agent import reason_detection_with_llm_fallback
 from mitre_agentic.agents.visualization_agent import build_navigator_layer_from_techniques, save_layer_json
-from mitre_agentic.agents.report_agent import write_executive_report_llm
+from mitre_agentic.agents.report_agent import aclose_http_client, write_executive_report_llm
 from mitre_agentic.agents.mitigation_agent import enrich_with_mitigations
+from mitre_agentic.utils.logsetup import setup_queue_logging
 import sys
 import io
 
@@ -86,39 +90,53 @@ def _safe_str(x, max_len: int) -> str:
 
 
 async def main() -> None:
+    # Root at WARNING so third-party debug/info chatter stays out of the
+    # demo output; the package's own loggers keep their INFO progress lines.
+    setup_queue_logging(logging.WARNING)
+    logging.getLogger("mitre_agentic").setLevel(logging.INFO)
+    for name in ("mcp", "anyio", "asyncio", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
     print("mitre-agentic demo: Agent 1 (LLM Triage) -> Agents 2-5 (MCP + LLM fallback)")
 
     # --- Agent 1: Triage (LLM) ---
+    # Runs as a task so the MCP server can spin up while the LLM call is in flight
     triage_input = TriageInput(incident_text=DEFAULT_INCIDENT_TEXT)
-    triage_out = await triage_incident(triage_input)
-
-    # Print triage summary if any
-    summary = getattr(triage_out, "summary", None) if not isinstance(triage_out, dict) else triage_out.get("summary")
-    if summary:
-        print("\n=== TRIAGE SUMMARY ===")
-        print(summary)
-
-    technique_ids = _extract_technique_ids_from_triage(triage_out)
-    if not technique_ids:
-        raise RuntimeError(
-            "Triage produced no technique IDs. Ensure triage_agent returns technique_candidates or technique_ids."
-        )
+    triage_task = asyncio.create_task(triage_incident(triage_input))
 
-    print("\n=== TRIAGE TECHNIQUE CANDIDATES (LLM) ===")
+    # --- MCP Client (shared across agents) ---
+    # max_concurrency bounds in-flight MCP calls across all fanned-out agents
+    client = MitreMcpClient(max_concurrency=16)
 
-    te = getattr(triage_out, "technique_evidence", None) if not isinstance(triage_out, dict) else triage_out.get("technique_evidence")
-    if isinstance(te, dict) and te:
-        for tid, evidence in te.items():
-            print(f"- {tid}: {evidence}")
-    else:
-        for tid in technique_ids:
-            print(f"- {tid}")
+    try:
+        # Connect and fetch the tool list (map_techniques checks it) in this task,
+        # which also owns close()
+        await client.has_tool("get_techniques_by_ids")
+
+        triage_out = await triage_task
+
+        # Print triage summary if any
+        summary = getattr(triage_out, "summary", None) if not isinstance(triage_out, dict) else triage_out.get("summary")
+        if summary:
+            print("\n=== TRIAGE SUMMARY ===")
+            print(summary)
+
+        technique_ids = _extract_technique_ids_from_triage(triage_out)
+        if not technique_ids:
+            raise RuntimeError(
+                "Triage produced no technique IDs. Ensure triage_agent returns technique_candidates or technique_ids."
+            )
 
+        print("\n=== TRIAGE TECHNIQUE CANDIDATES (LLM) ===")
+
+        te = getattr(triage_out, "technique_evidence", None) if not isinstance(triage_out, dict) else triage_out.get("technique_evidence")
+        if isinstance(te, dict) and te:
+            for tid, evidence in te.items():
+                print(f"- {tid}: {evidence}")
+        else:
+            for tid in technique_ids:
+                print(f"- {tid}")
 
-    # --- MCP Client (shared across agents) ---
-    client = MitreMcpClient()
 
-    try:
         # --- Agent 2: Mapping (confirm top-K via MCP) ---
         print("\n=== MAPPING (MCP confirm top-K) ===")
         mapping = await map_techniques(
@@ -138,15 +156,37 @@ async def main() -> None:
             if desc:
                 print(f"Description: {desc}")
 
-        # --- Agent 3: Intel (groups + software) ---
-        print("\n=== INTEL: groups/software associated with confirmed techniques ===")
-        intel = await enrich_with_groups_and_software(
-            client,
-            confirmed_techniques=confirmed,
-            domain="enterprise",
-            max_items=5,
+        # --- Agents 3, 4, mitigations and viz are independent: fan them out ---
+        intel, detections, mit, layer = await asyncio.gather(
+            enrich_with_groups_and_software(
+                client,
+                confirmed_techniques=confirmed,
+                domain="enterprise",
+                max_items=5,
+            ),
+            recommend_detection_telemetry(
+                client,
+                confirmed_techniques=confirmed,
+                domain="enterprise",
+                max_items=7,
+            ),
+            enrich_with_mitigations(
+                client,
+                confirmed_techniques=confirmed,
+                domain="enterprise",
+                include_description=False,
+            ),
+            build_navigator_layer_from_techniques(
+                client,
+                confirmed_techniques=confirmed,
+                domain="enterprise",
+                layer_name="EDR Incident: Technique Coverage",
+                description="WINWORD → PowerShell EncodedCommand → rundll32 DLL → Scheduled Task → External IP",
+            ),
         )
 
+        # --- Agent 3: Intel (groups + software) ---
+        print("\n=== INTEL: groups/software associated with confirmed techniques ===")
         for item in intel.get("intel", []) or []:
             tech = item.get("technique", {}) or {}
             print("\n---")
@@ -163,13 +203,6 @@ async def main() -> None:
 
         # --- Agent 4: Detection (STIX data components or technique detection fallback) ---
         print("\n=== DETECTION: telemetry/data components to detect confirmed techniques ===")
-        detections = await recommend_detection_telemetry(
-            client,
-            confirmed_techniques=confirmed,
-            domain="enterprise",
-            max_items=7,
-        )
-
         for item in detections.get("detections", []) or []:
             tech = item.get("technique", {}) or {}
             det = item.get("detection", {}) or {}
@@ -248,13 +281,6 @@ async def main() -> None:
 
             # --- MITIGATIONS: defensive controls for confirmed techniques ---
         print("\n=== MITIGATIONS: defensive controls for confirmed techniques ===")
-        mit = await enrich_with_mitigations(
-            client,
-            confirmed_techniques=confirmed,
-            domain="enterprise",
-            include_description=False,
-        )
-
         for item in mit.get("mitigations", []) or []:
             tech = item.get("technique", {}) or {}
             mitigations = item.get("mitigations", []) or []
@@ -274,16 +300,7 @@ async def main() -> None:
                 print(item["formatted"])
 
         print("\n=== VIZ: ATT&CK Navigator layer ===")
-        layer = await build_navigator_layer_from_techniques(
-            client,
-            confirmed_techniques=confirmed,
-            domain="enterprise",
-            layer_name="EDR Incident: Technique Coverage",
-            description="WINWORD → PowerShell EncodedCommand → rundll32 DLL → Scheduled Task → External IP",
-        )
-        
-
-        out_file = save_layer_json(layer, "./out/incident_layer.json")
+        out_file = await asyncio.to_thread(save_layer_json, layer, "./out/incident_layer.json")
         print(f"Navigator layer saved to: {out_file}")
         print("Upload it to https://mitre-attack.github.io/attack-navigator/ (Open Layer)")
 
@@ -303,13 +320,16 @@ async def main() -> None:
         md = report_out["report"]["markdown"]
         print(md[:1200] + ("\n...\n" if len(md) > 1200 else ""))
 
-        with open("./src/mitre_agentic/reporting/incident_report.md", "w", encoding="utf-8") as f:
-            f.write(md)
+        await asyncio.to_thread(
+            Path("./src/mitre_agentic/reporting/incident_report.md").write_text, md, encoding="utf-8"
+        )
         print("Saved: incident_report.md")
 
     finally:
+        triage_task.cancel()  # no-op once triage has finished
         await client.close()
+        await aclose_http_client()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    aio.run(main())
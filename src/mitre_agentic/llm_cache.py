@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from mitre_agentic.utils import jsonutil
+
+# Content-addressed on-disk cache for LLM outputs: one file per key under
+# CACHE_DIR/<key[:2]>/<key>.json, written atomically.
+CACHE_DIR = Path(os.getenv("MITRE_LLM_CACHE_DIR", "~/.cache/mitre_agentic/llm")).expanduser()
+
+# MITRE_LLM_CACHE=0 disables both lookups and writes.
+ENABLED = os.getenv("MITRE_LLM_CACHE", "1") != "0"
+
+DEFAULT_TTL = 86400
+
+
+def cache_key(*parts: str) -> str:
+    """sha256 over the '|'-joined parts."""
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace runs and trim, so incident text that only differs in
+    line wrapping/indentation maps to the same cache key.
+    """
+    return " ".join(text.split())
+
+
+def _path(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def get(key: str, ttl: Optional[float] = None) -> Optional[str]:
+    """Return the cached text for `key`, or None on miss/expired/unreadable entry."""
+    if not ENABLED:
+        return None
+    path = _path(key)
+    try:
+        if ttl is not None and time.time() - path.stat().st_mtime > ttl:
+            return None
+        return path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def put(key: str, text: str) -> None:
+    """Store `text` under `key` (best-effort; never raises on I/O errors)."""
+    if not ENABLED:
+        return
+    path = _path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
+
+
+async def cached_chat(
+    client_call: Callable[[], Awaitable[str]],
+    *,
+    key_parts: tuple,
+    parse: Callable[[str], Any],
+    ttl: float = DEFAULT_TTL,
+) -> Any:
+    """
+    Return parse(completion text) for `key_parts`, calling `client_call()`
+    only on a cache miss. `key_parts` should cover everything that shapes the
+    output (model, messages, temperature, response_format).
+
+    Only text that `parse` accepts is stored, so a truncated stream or a
+    malformed reply is retried on the next run instead of being replayed for
+    the whole TTL; a cached entry that no longer parses counts as a miss.
+    parse() errors on fresh text propagate to the caller.
+    File I/O runs in a worker thread so the event loop never blocks on disk.
+    """
+    if not ENABLED:
+        return parse(await client_call())
+
+    key = hashlib.sha256(jsonutil.dumps(key_parts, sort_keys=True).encode("utf-8")).hexdigest()
+    cached = await asyncio.to_thread(get, key, ttl)
+    if cached is not None:
+        try:
+            return parse(cached)
+        except ValueError:
+            pass  # stale/corrupt entry: regenerate
+
+    text = await client_call()
+    result = parse(text)
+    await asyncio.to_thread(put, key, text)
+    return result
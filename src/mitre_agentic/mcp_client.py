@@ -1,12 +1,22 @@
 from __future__ import annotations
 
 import os
+import json
 import asyncio
+import functools
+import itertools
+import logging
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+import anyio
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -16,33 +26,135 @@ class MCPServerConfig:
 
     @staticmethod
     def default() -> "MCPServerConfig":
-        command = os.getenv("MITRE_MCP_COMMAND", "npx")
-        args_raw = os.getenv("MITRE_MCP_ARGS", "-y @imouiche/mitre-attack-mcp-server")
-        return MCPServerConfig(command=command, args=args_raw.split())
+        """Config from MITRE_MCP_COMMAND / MITRE_MCP_ARGS, read once per process and shared."""
+        return _default_config()
+
+
+@functools.lru_cache(maxsize=1)
+def _default_config() -> MCPServerConfig:
+    command = os.getenv("MITRE_MCP_COMMAND", "npx")
+    args_raw = os.getenv("MITRE_MCP_ARGS", "-y @imouiche/mitre-attack-mcp-server")
+    return MCPServerConfig(command=command, args=args_raw.split())
+
+
+# Tools known to be pure lookups over the static ATT&CK dataset. Anything
+# else (including unknown "get_*" tools) bypasses PipelineCache.
+READONLY_TOOLS: frozenset[str] = frozenset(
+    {
+        "get_data_stats",
+        "get_datacomponents_detecting_technique",
+        "get_datacomponents_detecting_techniques",
+        "get_groups_using_technique",
+        "get_groups_using_techniques",
+        "get_mitigations_mitigating_technique",
+        "get_mitigations_mitigating_techniques",
+        "get_object_by_stix_id",
+        "get_software_using_technique",
+        "get_software_using_techniques",
+        "get_technique_by_id",
+        "get_technique_tactics",
+        "get_techniques_by_ids",
+        "get_techniques_tactics",
+    }
+)
+
+
+class PipelineCache:
+    """
+    Single-flight LRU cache of MCP tool results keyed by (tool name, arguments).
+
+    ATT&CK data is static for the lifetime of a session, so repeat lookups
+    across agents are free, and concurrent identical calls share one request.
+    Only tools listed in READONLY_TOOLS are cached; at most `maxsize`
+    results are kept (None = unbounded).
+    Owned by a MitreMcpClient by default; pass one instance to several
+    clients to share it across them. Cached results are shared objects;
+    treat them as read-only.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 1024) -> None:
+        # (tool_name, canonical args JSON) -> Task of the tool result, LRU order
+        self.calls: "OrderedDict[Tuple[str, str], asyncio.Task]" = OrderedDict()
+        self.maxsize = maxsize
+
+    def clear(self) -> None:
+        self.calls.clear()
+
+    async def call(self, client: "MitreMcpClient", tool_name: str, arguments: Dict[str, Any]) -> Any:
+        if tool_name not in READONLY_TOOLS:
+            return await client._call_tool_uncached(tool_name, arguments)
+
+        key = (tool_name, json.dumps(arguments, sort_keys=True, default=str))
+        task = self.calls.get(key)
+        if task is not None:
+            self.calls.move_to_end(key)
+        else:
+            # Single-flight: the request runs in its own task, stored before
+            # the first await so concurrent callers coalesce onto it
+            task = asyncio.ensure_future(client._call_tool_uncached(tool_name, arguments))
+            task.add_done_callback(functools.partial(self._settled, key))
+            self.calls[key] = task
+            if self.maxsize is not None and len(self.calls) > self.maxsize:
+                # Evicting an in-flight Task is fine: its waiters still get the result
+                self.calls.popitem(last=False)
+        # Every caller, the first included, is shielded: a cancelled waiter
+        # neither cancels the shared request nor the other waiters
+        return await asyncio.shield(task)
+
+    def _settled(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is None:
+            return
+        # Don't cache failures; the next caller retries. exception() above
+        # also marks it retrieved when every waiter was cancelled.
+        if self.calls.get(key) is task:
+            del self.calls[key]
 
 
 class MitreMcpClient:
     """
     MCP stdio client that reuses a single server session.
     Safe for concurrent tool calls and clean shutdown.
+
+    Tool results are memoized in a PipelineCache (see above). `cache` may be
+    True (private cache), False (no caching) or a shared PipelineCache.
+
+    `max_concurrency` caps in-flight tool calls across every agent sharing
+    this client, so fanned-out stages can't flood the server (None = no cap).
     """
 
-    def __init__(self, config: Optional[MCPServerConfig] = None) -> None:
+    def __init__(
+        self,
+        config: Optional[MCPServerConfig] = None,
+        *,
+        cache: Union[bool, PipelineCache] = True,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
         self.config = config or MCPServerConfig.default()
 
-        self._ctx = None
-        self._read = None
-        self._write = None
         self._session: Optional[ClientSession] = None
+        # Task that owns the stdio/session contexts (see _own_session)
+        self._owner: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        # Tool listing is static for a server's lifetime: fetched once, reset on close()
+        self._tools_cache: Optional[List[Dict[str, Any]]] = None
+        self._tools_lock = asyncio.Lock()
+        self._tool_names: Optional[frozenset[str]] = None
+
+        if isinstance(cache, PipelineCache):
+            self.cache: Optional[PipelineCache] = cache
+        else:
+            self.cache = PipelineCache() if cache else None
 
         # Concurrency / lifecycle controls
-        self._connect_lock = asyncio.Lock()
-        self._close_lock = asyncio.Lock()
+        # Startup task, done once the session is up; concurrent connect() callers await it
+        self._ready: Optional[asyncio.Task] = None
         self._closing = False
+        self._sem = asyncio.Semaphore(max_concurrency) if max_concurrency else None
 
+        # Plain counter on the hot path; close() only creates a future to wait
+        # on when calls are still in flight.
         self._inflight = 0
-        self._no_inflight = asyncio.Event()
-        self._no_inflight.set()
+        self._drain_future: Optional[asyncio.Future] = None
 
     async def __aenter__(self) -> "MitreMcpClient":
         await self.connect()
@@ -56,89 +168,300 @@ class MitreMcpClient:
         if self._session is not None:
             return
 
-        async with self._connect_lock:
-            # Double-check after acquiring lock
-            if self._session is not None:
-                return
+        if self._ready is None:
             if self._closing:
                 raise RuntimeError("Client is closing; cannot connect.")
+            # Single initializer: startup runs in its own task, published
+            # before the first await so concurrent callers share it
+            self._ready = asyncio.ensure_future(self._open())
+            self._ready.add_done_callback(self._open_done)
 
-            server_params = StdioServerParameters(
-                command=self.config.command,
-                args=self.config.args,
-            )
+        # Every caller, the initiator included, is shielded so one cancelled
+        # caller doesn't abort everyone else's startup
+        await asyncio.shield(self._ready)
 
-            # Keep the stdio context open
-            self._ctx = stdio_client(server_params)
-            self._read, self._write = await self._ctx.__aenter__()
+    def _open_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is None:
+            return
+        # Don't keep the failure; the next caller retries. exception() above
+        # also marks it retrieved when every caller was cancelled.
+        if self._ready is task:
+            self._ready = None
+
+    async def _open(self) -> None:
+        """Spawn the stdio server and set self._session once initialized."""
+        started = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._owner = asyncio.create_task(self._own_session(started, self._stop))
+        self._owner.add_done_callback(self._owner_done)
+        try:
+            # Shielded: if startup itself is cancelled, stop the owner below
+            await asyncio.shield(started)
+        except asyncio.CancelledError:
+            self._owner.cancel()
+            self._owner = None
+            raise
 
-            # Keep the MCP session open
-            self._session = ClientSession(self._read, self._write)
-            await self._session.__aenter__()
-            await self._session.initialize()
+    async def _own_session(self, started: asyncio.Future, stop: asyncio.Event) -> None:
+        """
+        Enter the stdio client and MCP session, then park until `stop` is set
+        (by close(), or by _drop_session() once the transport has closed).
+
+        anyio cancel scopes must be exited by the task that entered them, and
+        connect()/close() are routinely called from different tasks (graph
+        nodes, gather() children). Keeping both contexts in this one task lets
+        any task use or close the client.
+        """
+        server_params = StdioServerParameters(
+            command=self.config.command,
+            args=self.config.args,
+        )
+        session: Optional[ClientSession] = None
+        try:
+            async with stdio_client(server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self._session = session
+                    started.set_result(None)
+                    await stop.wait()
+        except BaseException as e:
+            if started.done():
+                raise
+            # Startup failed: report it to connect() instead of the task
+            if isinstance(e, asyncio.CancelledError):
+                started.cancel()
+            else:
+                started.set_exception(e)
+                started.exception()  # mark retrieved if connect() was cancelled
+        finally:
+            # Only clear state this owner still holds: after _drop_session()
+            # a newer connect() may already be starting or running
+            if session is not None and self._session is session:
+                self._session = None
+                if not self._closing:
+                    # Session ended on its own (server exited): let the next
+                    # connect() start a fresh one instead of trusting _ready
+                    self._ready = None
+
+    def _owner_done(self, task: asyncio.Task) -> None:
+        # Retrieve the exception here so a dead server is logged once rather
+        # than surfacing as "Task exception was never retrieved"
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None and not self._closing:
+            logger.warning("MCP session ended unexpectedly: %r", exc)
+
+    def _drop_session(self, session: ClientSession) -> None:
+        """
+        Forget a session whose transport has closed (server exited) and stop
+        its owner, so the next connect() spawns a fresh server.
+        """
+        if self._session is not session:
+            return  # already dropped, or replaced by a newer session
+        self._session = None
+        if not self._closing:
+            self._ready = None
+        self._stop.set()
+
+    def _require_session(self) -> ClientSession:
+        if self._session is None:
+            raise RuntimeError("MCP session ended; call connect() to start a new one.")
+        return self._session
 
     async def close(self) -> None:
-        # Ensure close is only running once
-        async with self._close_lock:
-            if self._closing:
-                return
-            self._closing = True
-
-            # Wait for any inflight tool calls to finish
-            await self._no_inflight.wait()
-
-            # Close MCP session first
-            if self._session is not None:
-                try:
-                    await self._session.__aexit__(None, None, None)
-                finally:
-                    self._session = None
-
-            # Then close stdio client context
-            if self._ctx is not None:
-                try:
-                    await self._ctx.__aexit__(None, None, None)
-                finally:
-                    self._ctx = None
-                    self._read = None
-                    self._write = None
+        # Single event-loop thread: flipping the flag before the first await
+        # is enough to make close() run once; later callers return at once.
+        if self._closing:
+            return
+        self._closing = True
+
+        # Wait for any inflight tool calls to finish
+        if self._inflight > 0:
+            self._drain_future = asyncio.get_running_loop().create_future()
+            try:
+                await self._drain_future
+            finally:
+                self._drain_future = None
+
+        self._ready = None
+        self._tools_cache = None
+        self._tool_names = None
+        await self._shutdown()
+
+    async def _shutdown(self) -> None:
+        owner, self._owner = self._owner, None
+        if owner is None or owner.done():
+            return  # never started, or already ended (and reported)
+        self._stop.set()
+        # Re-raises anything the session hit while open (or on exit)
+        await owner
 
     async def list_tools(self) -> List[Dict[str, Any]]:
-        await self.connect()
-        assert self._session is not None
+        """Tools advertised by the server (fetched once per connection; treat as read-only)."""
+        if self._tools_cache is not None:
+            return self._tools_cache
 
-        self._begin_call()
-        try:
-            resp = await self._session.list_tools()
-            return [{"name": t.name, "description": t.description, "inputSchema": t.inputSchema} for t in resp.tools]
-        finally:
-            self._end_call()
+        async with self._tools_lock:
+            if self._tools_cache is not None:
+                return self._tools_cache
+
+            await self.connect()
+            session = self._require_session()
+
+            self._begin_call()
+            try:
+                resp = await session.list_tools()
+            finally:
+                self._end_call()
+            self._tools_cache = [
+                {"name": t.name, "description": t.description, "inputSchema": t.inputSchema} for t in resp.tools
+            ]
+            return self._tools_cache
+
+    @property
+    def tools(self) -> Optional[List[Dict[str, Any]]]:
+        """Cached tool listing, or None until list_tools() has run."""
+        return self._tools_cache
+
+    async def has_tool(self, tool_name: str) -> bool:
+        """Whether the server advertises `tool_name` (tool names are fetched once per client)."""
+        if self._tool_names is None:
+            self._tool_names = frozenset(t["name"] for t in await self.list_tools())
+        return tool_name in self._tool_names
+
+    async def call_tool_batch(
+        self,
+        tool_name: str,
+        *,
+        ids_arg: str,
+        ids: List[str],
+        arguments: Optional[Dict[str, Any]] = None,
+        batch_size: int = 32,
+    ) -> Dict[str, Any]:
+        """
+        Call a batch tool (list of IDs in, {id: payload} out).
+
+        IDs are sent in chunks of `batch_size` (one round trip each, issued
+        concurrently) so a large technique set doesn't become one oversized
+        request/response on the stdio pipe.
+
+        Each payload has the same shape as the matching single-ID tool's result,
+        so callers can reuse their per-ID parsing. Missing IDs are simply absent.
+        """
+        chunks = [list(c) for c in itertools.batched(ids, max(1, batch_size))]
+        if len(chunks) <= 1:
+            return await self._call_tool_batch_chunk(tool_name, ids_arg, list(ids), arguments)
+
+        merged: Dict[str, Any] = {}
+        for part in await asyncio.gather(
+            *(self._call_tool_batch_chunk(tool_name, ids_arg, c, arguments) for c in chunks)
+        ):
+            merged.update(part)
+        return merged
+
+    async def _call_tool_batch_chunk(
+        self,
+        tool_name: str,
+        ids_arg: str,
+        ids: List[str],
+        arguments: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        resp = await self.call_tool(tool_name, {ids_arg: ids, **(arguments or {})})
+        payload = resp.get("result", resp) if isinstance(resp, dict) else resp
+        if isinstance(payload, dict) and isinstance(payload.get("results"), dict):
+            payload = payload["results"]
+        return payload if isinstance(payload, dict) else {}
 
     async def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+        arguments = arguments or {}
+        if self.cache is None:
+            return await self._call_tool_uncached(tool_name, arguments)
+        return await self.cache.call(self, tool_name, arguments)
+
+    async def _call_tool_uncached(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
         await self.connect()
-        assert self._session is not None
+        if self._sem is None:
+            return await self._send_call(tool_name, arguments)
+        async with self._sem:
+            return await self._send_call(tool_name, arguments)
+
+    async def _send_call(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        session = self._require_session()
 
         self._begin_call()
         try:
-            result = await self._session.call_tool(tool_name, arguments or {})
-            if hasattr(result, "structuredContent") and result.structuredContent is not None:
-                return result.structuredContent
-            if hasattr(result, "content"):
-                return result.content
-            return result
+            result = await session.call_tool(tool_name, arguments)
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            self._drop_session(session)
+            raise
+        except McpError as e:
+            if e.error.code == CONNECTION_CLOSED:
+                self._drop_session(session)
+            raise
         finally:
             self._end_call()
+        structured = getattr(result, "structuredContent", None)
+        if structured is not None:
+            return structured
+        return getattr(result, "content", result)
 
     def _begin_call(self) -> None:
         # Called from within the event loop thread
         if self._closing:
             raise RuntimeError("Client is closing; refusing new requests.")
         self._inflight += 1
-        if self._inflight == 1:
-            self._no_inflight.clear()
 
     def _end_call(self) -> None:
         self._inflight -= 1
-        if self._inflight <= 0:
-            self._inflight = 0
-            self._no_inflight.set()
+        if self._inflight == 0 and self._drain_future is not None and not self._drain_future.done():
+            self._drain_future.set_result(None)
+
+
+class MitreMcpPool(MitreMcpClient):
+    """
+    Drop-in MitreMcpClient that spreads tool calls over `size` stdio server
+    replicas, so parallel agents don't queue on one JSON-RPC pipe.
+
+    Each call goes to the least-busy replica. The cache, concurrency cap and
+    tool listing are pool-wide (tool metadata comes from the first replica).
+    Each replica owns its session in its own task, so they start concurrently.
+    """
+
+    def __init__(
+        self,
+        config: Optional[MCPServerConfig] = None,
+        *,
+        size: Optional[int] = None,
+        cache: Union[bool, PipelineCache] = True,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        super().__init__(config, cache=cache, max_concurrency=max_concurrency)
+        size = size or min(os.cpu_count() or 1, 4)
+        self._clients = [MitreMcpClient(self.config, cache=False) for _ in range(max(1, size))]
+
+    async def connect(self) -> None:
+        await super().connect()
+        # Pool-level session calls (list_tools) go to the first replica;
+        # no-op unless its server died
+        await self._clients[0].connect()
+
+    async def _open(self) -> None:
+        await asyncio.gather(*(c.connect() for c in self._clients))
+
+    def _require_session(self) -> ClientSession:
+        return self._clients[0]._require_session()
+
+    async def _shutdown(self) -> None:
+        await asyncio.gather(*(c.close() for c in self._clients))
+
+    async def _send_call(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        # Replica counters are bumped synchronously inside _send_call, so
+        # concurrent dispatches see each other's picks
+        client = min(self._clients, key=lambda c: c._inflight)
+        await client.connect()  # no-op unless that replica's server died
+        self._begin_call()
+        try:
+            return await client._send_call(tool_name, arguments)
+        finally:
+            self._end_call()
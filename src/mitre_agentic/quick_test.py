@@ -2,30 +2,39 @@
 import asyncio
 from mitre_agentic.mcp_client import MitreMcpClient
 
+TECHNIQUE_STIX_IDS = [
+    "attack-pattern--457c7820-d331-465a-915e-42f85500ccc4",
+    "attack-pattern--43e7dc91-05b2-474c-b9ac-2ed4fe101f4d",
+]
+
+
 async def test():
-    client = MitreMcpClient()
-    try:
-        resp = await client.call_tool(
-            "get_mitigations_mitigating_technique",
-            {
-                "technique_stix_id": "attack-pattern--457c7820-d331-465a-915e-42f85500ccc4",
-                "domain": "enterprise",
-                "include_description": False,
-            }
-        )
-        
+    # Reuse one session and issue the per-technique lookups concurrently
+    async with MitreMcpClient() as client:
+        resps = await asyncio.gather(*(
+            client.call_tool(
+                "get_mitigations_mitigating_technique",
+                {
+                    "technique_stix_id": stix_id,
+                    "domain": "enterprise",
+                    "include_description": False,
+                }
+            )
+            for stix_id in TECHNIQUE_STIX_IDS
+        ))
+
+    for stix_id, resp in zip(TECHNIQUE_STIX_IDS, resps):
         mitigations = resp.get("result", {}).get("mitigations", [])
-        print(f"Found {len(mitigations)} mitigations")
-        if mitigations:
+        print(f"{stix_id}: found {len(mitigations)} mitigations")
+        if len(mitigations) >= 2:
             first = mitigations[0]
             second = mitigations[1]
             print(f"First: {first}")
             print(f"Second: {second}")
-            if first.get("name"):
+        if mitigations:
+            if mitigations[0].get("name"):
                 print("Fixed!")
             else:
                 print("Still broken - server not restarted")
-    finally:
-        await client.close()
 
-asyncio.run(test())
\ No newline at end of file
+asyncio.run(test())
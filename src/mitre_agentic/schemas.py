@@ -1,14 +1,22 @@
 from __future__ import annotations
 
-from typing import Dict, List, Literal, Optional
-from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 Confidence = Literal["low", "medium", "high"]
 
+# Instances are built once from LLM/MCP output and only read afterwards;
+# use model_copy(update=...) to derive a changed copy.
+_FROZEN = ConfigDict(frozen=True, extra="ignore")
+
 class TriageInput(BaseModel):
+    model_config = _FROZEN
+
     incident_text: str = Field(..., min_length=10)
 
 class TriagePlanStep(BaseModel):
+    model_config = _FROZEN
+
     step: int
     actor: Literal["mapping_agent", "intel_agent", "detection_agent", "viz_agent", "report_agent"]
     intent: str
@@ -16,6 +24,8 @@ class TriagePlanStep(BaseModel):
     notes: Optional[str] = None
 
 class TriageOutput(BaseModel):
+    model_config = _FROZEN
+
     summary: str
     suspected_behaviors: List[str] = Field(default_factory=list)
     keywords: List[str] = Field(default_factory=list)
@@ -29,70 +39,94 @@ class TriageOutput(BaseModel):
 
 
 def _clip(s: str, max_len: int) -> str:
-    s = (s or "").strip()
+    if not s:
+        return ""
+    # Only pay for a strip() copy when there is whitespace to remove
+    if s[:1].isspace() or s[-1:].isspace():
+        s = s.strip()
     if len(s) <= max_len:
         return s
     # keep it readable; ensure final length <= max_len
     return (s[: max_len - 1].rstrip()) + "…"
 
 
+def _apply_clips(
+    data: Any,
+    strs: Tuple[Tuple[str, int], ...],
+    lists: Tuple[Tuple[str, int, Optional[int]], ...] = (),
+) -> Any:
+    """
+    One pre-validation pass clipping (field, max_len) strings and
+    (field, item_max_len, max_items) string lists, so each model needs a
+    single validator callback instead of one per field.
+    """
+    if not isinstance(data, dict):
+        return data
+    data = dict(data)
+    for k, n in strs:
+        if k in data:
+            data[k] = _clip(str(data[k]), n)
+    for k, n, cap in lists:
+        v = data.get(k)
+        if isinstance(v, list):
+            data[k] = [_clip(str(x), n) for x in v[:cap]]
+    return data
+
+
 class DetectionHypothesis(BaseModel):
+    model_config = _FROZEN
+
     title: str = Field(max_length=140)
     telemetry: List[str] = Field(min_length=2, max_length=8)
     rationale: str = Field(max_length=400)
     confidence: Confidence
 
     # Auto-truncate instead of crashing validation
-    @field_validator("title", mode="before")
-    @classmethod
-    def _clip_title(cls, v: str) -> str:
-        return _clip(str(v), 140)
-
-    @field_validator("rationale", mode="before")
-    @classmethod
-    def _clip_rationale(cls, v: str) -> str:
-        return _clip(str(v), 400)
-
-    @field_validator("telemetry", mode="before")
+    @model_validator(mode="before")
     @classmethod
-    def _clip_telemetry_items(cls, v):
-        if not isinstance(v, list):
-            return v
-        return [_clip(str(x), 180) for x in v]
+    def _clip_fields(cls, data: Any) -> Any:
+        return _apply_clips(data, (("title", 140), ("rationale", 400)), (("telemetry", 140, None),))
 
 
 class DetectionLLMOutput(BaseModel):
+    model_config = _FROZEN
+
     technique_id: str = Field(max_length=140)
     technique_name: str = Field(max_length=140)
     hypotheses: List[DetectionHypothesis] = Field(min_length=1, max_length=5)
 
-    @field_validator("technique_id", mode="before")
-    @classmethod
-    def _clip_tid(cls, v: str) -> str:
-        return _clip(str(v), 140)
-
-    @field_validator("technique_name", mode="before")
+    @model_validator(mode="before")
     @classmethod
-    def _clip_tname(cls, v: str) -> str:
-        return _clip(str(v), 140)
+    def _clip_fields(cls, data: Any) -> Any:
+        return _apply_clips(data, (("technique_id", 140), ("technique_name", 140)))
 
 
 # Report schema
 
 class ReportIOCSummary(BaseModel):
+    model_config = _FROZEN
+
     suspected_artifacts: List[str] = Field(default_factory=list, max_length=30)
     suspicious_processes: List[str] = Field(default_factory=list, max_length=30)
     suspicious_network: List[str] = Field(default_factory=list, max_length=30)
 
-    @field_validator("suspected_artifacts", "suspicious_processes", "suspicious_network", mode="before")
+    @model_validator(mode="before")
     @classmethod
-    def _clip_list_items(cls, v):
-        if not isinstance(v, list):
-            return v
-        return [_clip(str(x), 180) for x in v][:30]
+    def _clip_fields(cls, data: Any) -> Any:
+        return _apply_clips(
+            data,
+            (),
+            (
+                ("suspected_artifacts", 180, 30),
+                ("suspicious_processes", 180, 30),
+                ("suspicious_network", 180, 30),
+            ),
+        )
 
 
 class IncidentExecutiveReport(BaseModel):
+    model_config = _FROZEN
+
     title: str = Field(max_length=140)
     executive_summary: str = Field(max_length=900)
     likely_attack_flow: List[str] = Field(min_length=3, max_length=12)
@@ -105,25 +139,17 @@ class IncidentExecutiveReport(BaseModel):
     markdown: str = Field(max_length=12000)
 
     # Auto-truncate everywhere it matters
-    @field_validator("title", mode="before")
-    @classmethod
-    def _clip_title(cls, v: str) -> str:
-        return _clip(str(v), 140)
-
-    @field_validator("executive_summary", mode="before")
-    @classmethod
-    def _clip_exec(cls, v: str) -> str:
-        return _clip(str(v), 900)
-
-    @field_validator("markdown", mode="before")
-    @classmethod
-    def _clip_md(cls, v: str) -> str:
-        return _clip(str(v), 12000)
-
-    @field_validator("likely_attack_flow", "mapped_techniques", "notable_groups_software",
-                     "detection_recommendations", "immediate_actions", mode="before")
+    @model_validator(mode="before")
     @classmethod
-    def _clip_lines(cls, v):
-        if not isinstance(v, list):
-            return v
-        return [_clip(str(x), 240) for x in v]
+    def _clip_fields(cls, data: Any) -> Any:
+        return _apply_clips(
+            data,
+            (("title", 140), ("executive_summary", 900), ("markdown", 12000)),
+            (
+                ("likely_attack_flow", 240, None),
+                ("mapped_techniques", 240, None),
+                ("notable_groups_software", 240, None),
+                ("detection_recommendations", 240, None),
+                ("immediate_actions", 240, None),
+            ),
+        )
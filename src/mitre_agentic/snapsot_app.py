@@ -8,7 +8,6 @@ load_dotenv()
 
 async def main() -> None:
     print("mitre-agentic demo: scaffold ok")
-    client = MitreMcpClient()
 
     # out = await client.run(
     #     tool_calls=[
@@ -39,15 +38,20 @@ async def main() -> None:
     technique_stix_id = "attack-pattern--43e7dc91-05b2-474c-b9ac-2ed4fe101f4d"
 
     print("\nFetching groups and software for technique T1055...")
-    groups = await client.call_tool("get_groups_using_technique", {
-        "technique_stix_id": technique_stix_id,
-        "domain": "enterprise"
-    })
-
-    software = await client.call_tool("get_software_using_technique", {
-        "technique_stix_id": technique_stix_id,
-        "domain": "enterprise"
-    })
+    # One reused session; independent lookups go out concurrently, so this
+    # takes max(groups, software) rather than their sum. For many agents in
+    # parallel, MitreMcpPool is a drop-in replacement.
+    async with MitreMcpClient() as client:
+        groups, software = await asyncio.gather(
+            client.call_tool("get_groups_using_technique", {
+                "technique_stix_id": technique_stix_id,
+                "domain": "enterprise"
+            }),
+            client.call_tool("get_software_using_technique", {
+                "technique_stix_id": technique_stix_id,
+                "domain": "enterprise"
+            }),
+        )
 
     print("\n Groups for technique T1055:")
     print(groups)
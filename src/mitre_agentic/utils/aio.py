@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Coroutine, TypeVar
+
+# uvloop is optional (not available on Windows): a libuv-based event loop
+# that cuts per-callback overhead for the MCP pipe and LLM HTTP traffic.
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - depends on environment
+    uvloop = None
+
+T = TypeVar("T")
+
+
+def run(main: Coroutine[Any, Any, T]) -> T:
+    """asyncio.run() on a uvloop loop when installed, the default loop otherwise."""
+    loop_factory = uvloop.new_event_loop if uvloop is not None else None
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        return runner.run(main)
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+def safe_get(d: Any, *path: str, default: Any = None) -> Any:
+    """Safely navigate nested dict structure."""
+    cur = d
+    for p in path:
+        if not isinstance(cur, dict) or p not in cur:
+            return default
+        cur = cur[p]
+    return cur
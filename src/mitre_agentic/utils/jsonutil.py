@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+# orjson is optional: a C extension that is several times faster than the
+# stdlib for both encoding and decoding. Output is always compact.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+
+def dumps(obj: Any, *, sort_keys: bool = False, indent: bool = False) -> str:
+    """Serialize to a JSON string: compact, or 2-space indented with indent=True."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=str, option=option).decode("utf-8")
+    if indent:
+        return json.dumps(obj, sort_keys=sort_keys, indent=2, ensure_ascii=False, default=str)
+    return json.dumps(obj, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def loads(data: str | bytes) -> Any:
+    """Parse JSON; raises ValueError on malformed input (both backends)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
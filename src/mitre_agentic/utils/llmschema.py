@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Type
+
+from pydantic import BaseModel
+
+# Keywords OpenAI strict structured outputs rejects. Length limits are still
+# enforced (or clipped) by the pydantic model on the way back in.
+_STRICT_UNSUPPORTED = frozenset({"default", "title", "maxLength", "minLength"})
+
+
+def _strictify(node: Any) -> Any:
+    if isinstance(node, list):
+        return [_strictify(x) for x in node]
+    if not isinstance(node, dict):
+        return node
+
+    out: Dict[str, Any] = {}
+    for k, v in node.items():
+        if k in _STRICT_UNSUPPORTED:
+            continue
+        if k in ("properties", "$defs") and isinstance(v, dict):
+            # Keys here are field/def names, not schema keywords
+            out[k] = {name: _strictify(sub) for name, sub in v.items()}
+        else:
+            out[k] = _strictify(v)
+
+    if "properties" in out:
+        out["additionalProperties"] = False
+        out["required"] = list(out["properties"])
+    return out
+
+
+def json_schema_response_format(model: Type[BaseModel], *, strict: bool = True) -> Dict[str, Any]:
+    """
+    Build an OpenAI `response_format` of type json_schema from a pydantic model.
+
+    strict=True rewrites the schema to the strict subset (all fields required,
+    no extra properties). Models with open-keyed maps (Dict[str, ...]) can't be
+    expressed in strict mode; pass strict=False for those.
+    """
+    schema = model.model_json_schema()
+    if strict:
+        schema = _strictify(schema)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": schema, "strict": strict},
+    }
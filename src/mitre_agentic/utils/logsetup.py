@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+_LISTENER: Optional[QueueListener] = None
+
+
+def setup_queue_logging(level: int = logging.INFO) -> QueueListener:
+    """
+    Route root logging through a QueueHandler so emitting a record from the
+    event loop is just a queue put; a background QueueListener thread does
+    the actual (blocking) stream writes. Idempotent.
+    """
+    global _LISTENER
+    if _LISTENER is not None:
+        return _LISTENER
+
+    q: queue.SimpleQueue = queue.SimpleQueue()
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(q)]
+    root.setLevel(level)
+
+    _LISTENER = QueueListener(q, handler, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(_LISTENER.stop)
+    return _LISTENER
@@ -1,24 +1,24 @@
 from __future__ import annotations
 
-from typing import Literal, AsyncIterator, Dict, Any, Optional
-from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.checkpoint.base import BaseCheckpointSaver
+import asyncio
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal, AsyncIterator, Dict, Any, Optional
 
+# Runtime import: LangGraph resolves the branch function's type hints
 from mitre_agentic.workflows.state import InvestigationState
-from mitre_agentic.workflows.nodes import (
-    triage_node,
-    mapping_node,
-    intel_node,
-    detection_node,
-    mitigation_node,
-    detection_reasoning_node,
-    visualization_node,
-    report_node,
-)
+
+# langgraph's builder/checkpointers and the node modules (which pull in every
+# agent and its HTTP/LLM clients) are imported where the graph is built, so
+# importing this module for its helpers stays cheap.
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+    from langgraph.checkpoint.base import BaseCheckpointSaver
 
 CompiledGraphType = Any  # This is the return type from workflow.compile()
 
+logger = logging.getLogger(__name__)
+
 # ========== Conditional Edge Logic ==========
 
 def should_run_detection_reasoning(state: InvestigationState) -> Literal["detection_reasoning", "visualization"]:
@@ -28,42 +28,43 @@ def should_run_detection_reasoning(state: InvestigationState) -> Literal["detect
     If any technique has 0 data components, run LLM reasoning.
     Otherwise, skip to visualization.
     """
-    detections = state.get("detections", {})
-    detection_list = detections.get("detections", [])
-    
-    # Check if any technique has 0 data components
-    for item in detection_list:
-        detection_data = item.get("detection", {})
-        total_components = detection_data.get("total_datacomponents", 0)
-        
-        if total_components == 0:
-            print("Some techniques have 0 data components → Running Detection Reasoning")
-            return "detection_reasoning"
-    
-    print("All techniques have STIX data → Skipping Detection Reasoning")
-    return "visualization"
+    detection_list = state.get("detections", {}).get("detections", [])
+
+    # Any technique with 0 data components needs LLM reasoning
+    needs_reasoning = any(
+        item.get("detection", {}).get("total_datacomponents", 0) == 0 for item in detection_list
+    )
+
+    logger.debug(
+        "Detection reasoning %s (%d techniques checked)",
+        "needed" if needs_reasoning else "skipped",
+        len(detection_list),
+    )
+    return "detection_reasoning" if needs_reasoning else "visualization"
 
 
 # ========== Graph Construction ==========
 
-def create_investigation_graph(
-    checkpointer: Optional[BaseCheckpointSaver] = None
-) -> Any:  # ← Fixed return type
-    """
-    Create the MITRE ATT&CK investigation workflow graph.
-    
-    Flow:
-        START → triage → mapping → [intel, detection, mitigation] (parallel)
-              → detection_reasoning (conditional) → visualization → report → END
-    
-    Args:
-        checkpointer: Optional checkpoint saver for persistence.
-                     Use MemorySaver() for in-memory checkpoints.
-    
-    Returns:
-        Compiled StateGraph ready for execution.
-    """
-    
+# The topology is static: build the StateGraph once, and reuse the compiled
+# graph for the no-checkpointer case (only the checkpointer varies per caller).
+_WORKFLOW: Optional[StateGraph] = None
+_COMPILED_NO_CKPT: Optional[CompiledGraphType] = None
+
+
+def _build_workflow() -> StateGraph:
+    from langgraph.graph import StateGraph, START, END
+
+    from mitre_agentic.workflows.nodes import (
+        triage_node,
+        mapping_node,
+        intel_node,
+        detection_node,
+        mitigation_node,
+        detection_reasoning_node,
+        visualization_node,
+        report_node,
+    )
+
     # Initialize graph
     workflow = StateGraph(InvestigationState)
     
@@ -113,20 +114,50 @@ def create_investigation_graph(
     
     # Final: report → END
     workflow.add_edge("report", END)
+
+    return workflow
+
+
+def _get_workflow() -> StateGraph:
+    global _WORKFLOW
+    if _WORKFLOW is None:
+        _WORKFLOW = _build_workflow()
+    return _WORKFLOW
+
+
+def create_investigation_graph(
+    checkpointer: Optional[BaseCheckpointSaver] = None
+) -> Any:  # ← Fixed return type
+    """
+    Create the MITRE ATT&CK investigation workflow graph.
     
-    # ========== Compile Graph ==========
+    Flow:
+        START → triage → mapping → [intel, detection, mitigation] (parallel)
+              → detection_reasoning (conditional) → visualization → report → END
     
-    # Compile with optional checkpointing
-    if checkpointer is None:
-        app = workflow.compile()
-    else:
-        app = workflow.compile(checkpointer=checkpointer)
+    Args:
+        checkpointer: Optional checkpoint saver for persistence.
+                     Use MemorySaver() for in-memory checkpoints.
+    
+    Returns:
+        Compiled StateGraph ready for execution.
+    """
     
-    return app
+    global _COMPILED_NO_CKPT
+    if checkpointer is None:
+        if _COMPILED_NO_CKPT is None:
+            _COMPILED_NO_CKPT = _get_workflow().compile()
+        return _COMPILED_NO_CKPT
+
+    # Each caller may want its own checkpointer, so these aren't cached
+    return _get_workflow().compile(checkpointer=checkpointer)
 
 
 # ========== Convenience Functions ==========
 
+_COMPILED_WITH_MEMORY: Optional[CompiledGraphType] = None
+
+
 def create_graph_with_memory() -> Any:  # ← Fixed return type
     """
     Create investigation graph with in-memory checkpointing.
@@ -141,8 +172,13 @@ def create_graph_with_memory() -> Any:  # ← Fixed return type
         config = {"configurable": {"thread_id": "investigation-123"}}
         result = await graph.ainvoke(initial_state, config)
     """
-    checkpointer = MemorySaver()
-    return create_investigation_graph(checkpointer=checkpointer)
+    global _COMPILED_WITH_MEMORY
+    if _COMPILED_WITH_MEMORY is None:
+        from langgraph.checkpoint.memory import MemorySaver
+
+        # Process-wide MemorySaver; runs are kept apart by thread_id
+        _COMPILED_WITH_MEMORY = create_investigation_graph(checkpointer=MemorySaver())
+    return _COMPILED_WITH_MEMORY
 
 
 def create_graph_no_checkpointing() -> Any:  # ← Fixed return type
@@ -157,11 +193,44 @@ def create_graph_no_checkpointing() -> Any:  # ← Fixed return type
 
 # ========== Streaming Helpers ==========
 
+class _StreamUpdate:
+    """
+    One streamed node update. Supports the same update["node"] / ["state"] /
+    ["completed_agents"] / ["errors"] access as the old per-update dict, but
+    the last two are only read from the state when asked for.
+    """
+
+    __slots__ = ("node", "state")
+
+    def __init__(self, node: str, state: Dict[str, Any]) -> None:
+        self.node = node
+        self.state = state
+
+    @property
+    def completed_agents(self) -> Dict[str, float]:
+        return self.state.get("completed_agents", {})
+
+    @property
+    def errors(self) -> list:
+        return self.state.get("errors", [])
+
+    def __getitem__(self, key: str) -> Any:
+        if key in ("node", "state", "completed_agents", "errors"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
 async def stream_investigation(
     graph: Any,
     initial_state: InvestigationState,
     config: Optional[Dict[str, Any]] = None  # ← Fixed type hint
-) -> AsyncIterator[Dict[str, Any]]:  # ← Fixed return type
+) -> AsyncIterator[_StreamUpdate]:
     """
     Stream investigation progress with real-time updates.
     
@@ -171,7 +240,7 @@ async def stream_investigation(
         config: Optional config (e.g., thread_id for checkpointing)
     
     Yields:
-        Dict with node name and updated state after each step
+        Mapping-style update with node name and updated state after each step
     
     Usage:
         graph = create_graph_with_memory()
@@ -188,12 +257,7 @@ async def stream_investigation(
     
     async for event in graph.astream(initial_state, config, stream_mode="updates"):
         for node_name, node_state in event.items():
-            yield {
-                "node": node_name,
-                "state": node_state,
-                "completed_agents": node_state.get("completed_agents", []),
-                "errors": node_state.get("errors", []),
-            }
+            yield _StreamUpdate(node_name, node_state)
 
 
 async def run_investigation(
@@ -303,7 +367,7 @@ async def resume_from_checkpoint(
 # ========== Visualization ==========
 
 
-def visualize_graph(
+async def visualize_graph(
     graph: Any,
     output_path: str = "./out/workflow_graph.png"
 ) -> None:
@@ -318,11 +382,14 @@ def visualize_graph(
     
     Usage:
         graph = create_graph_with_memory()
-        visualize_graph(graph, "./workflow.png")
+        await visualize_graph(graph, "./workflow.png")
+
+    From synchronous code, use visualize_graph_sync().
     """
     try:
-        # Get mermaid diagram
-        mermaid_code = graph.get_graph().draw_mermaid()
+        # Get mermaid diagram (cheap, stays on the loop)
+        drawable = graph.get_graph()
+        mermaid_code = drawable.draw_mermaid()
         
         print("\n" + "="*80)
         print("WORKFLOW GRAPH (Mermaid)")
@@ -332,9 +399,9 @@ def visualize_graph(
         
         # Try to render PNG if graphviz available
         try:
-            png_data = graph.get_graph().draw_mermaid_png()
-            with open(output_path, "wb") as f:
-                f.write(png_data)
+            # Rendering can shell out / hit the network: keep it off the event loop
+            png_data = await asyncio.to_thread(drawable.draw_mermaid_png)
+            await asyncio.to_thread(Path(output_path).write_bytes, png_data)
             print(f"Graph PNG saved to {output_path}")
         except Exception as e:
             print(f"Could not render PNG: {e}")
@@ -342,14 +409,22 @@ def visualize_graph(
             
             # Save mermaid code as fallback
             mermaid_path = output_path.replace(".png", ".mmd")
-            with open(mermaid_path, "w") as f:
-                f.write(mermaid_code)
+            await asyncio.to_thread(Path(mermaid_path).write_text, mermaid_code)
             print(f"Mermaid code saved to {mermaid_path}")
             print("Visualize at: https://mermaid.live/")
     
     except Exception as e:
         print(f" Visualization failed: {e}")
 
+
+def visualize_graph_sync(
+    graph: Any,
+    output_path: str = "./out/workflow_graph.png"
+) -> None:
+    """Synchronous wrapper around visualize_graph for scripts (no running loop)."""
+    asyncio.run(visualize_graph(graph, output_path))
+
+
 # ========== Debug Utilities ==========
 
 def print_graph_structure(graph: Any) -> None:
@@ -366,4 +441,4 @@ def print_graph_structure(graph: Any) -> None:
     for edge in graph.get_graph().edges:
         print(f"  {edge[0]} → {edge[1]}")
     
-    print("\n" + "="*80 + "\n")
\ No newline at end of file
+    print("\n" + "="*80 + "\n")
@@ -2,8 +2,14 @@ from __future__ import annotations
 
 import time
 import asyncio
+import functools
+import logging
+import random
+from pathlib import Path
 from typing import Any, Dict
 
+import httpx
+
 from mitre_agentic.workflows.state import InvestigationState, mark_agent_complete, add_error, add_timing
 from mitre_agentic.schemas import TriageInput
 from mitre_agentic.agents.triage_agent import triage_incident
@@ -16,54 +22,55 @@ from mitre_agentic.agents.visualization_agent import build_navigator_layer_from_
 from mitre_agentic.agents.report_agent import write_executive_report_llm
 from mitre_agentic.mcp_client import MitreMcpClient
 
+logger = logging.getLogger(__name__)
+
 
 # ========== Helper: Retry Decorator ==========
 
+# Only failures that a second attempt can plausibly fix are retried; bad
+# data (ValueError etc.) fails fast.
+_TRANSIENT_ERRORS = (httpx.HTTPError, asyncio.TimeoutError, ConnectionError)
+
+
 def retry_async(max_attempts: int = 1, backoff: float = 1.0):
-    """Decorator to retry async functions with exponential backoff."""
+    """
+    Decorator to retry async functions on transient errors with exponential
+    backoff and full jitter. With max_attempts <= 1 the function is returned
+    unwrapped (no extra frame per call).
+    """
     def decorator(func):
+        if max_attempts <= 1:
+            return func
+
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            last_exception: Exception | None = None  # Type hint fix
             for attempt in range(1, max_attempts + 1):
                 try:
                     return await func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    if attempt < max_attempts:
-                        wait_time = backoff * (2 ** (attempt - 1))
-                        print(f"⚠️  {func.__name__} attempt {attempt} failed: {e}")
-                        print(f"   Retrying in {wait_time}s...")
-                        await asyncio.sleep(wait_time)
-                    else:
-                        print(f"❌ {func.__name__} failed after {max_attempts} attempts")
-            
-            # Raise the last exception (guaranteed to be set here)
-            if last_exception is not None:
-                raise last_exception
-            else:
-                raise RuntimeError(f"{func.__name__} failed with no exception captured")
-        
+                except _TRANSIENT_ERRORS as e:
+                    if attempt == max_attempts:
+                        logger.error("❌ %s failed after %s attempts", func.__name__, max_attempts)
+                        raise
+                    # Jitter keeps parallel retries from hitting the server in lockstep
+                    wait_time = random.uniform(0, backoff * (2 ** (attempt - 1)))
+                    logger.warning(
+                        "⚠️  %s attempt %s failed: %s; retrying in %.1fs",
+                        func.__name__, attempt, e, wait_time,
+                    )
+                    await asyncio.sleep(wait_time)
+
         return wrapper
     return decorator
 
 
-# ========== Helper: Extract Technique IDs ==========
+# ========== Helper: Output Directory ==========
 
-def _extract_technique_ids(triage_out: Any) -> list[str]:
-    """Extract technique IDs from triage output (object or dict)."""
-    # Object-style
-    if hasattr(triage_out, "technique_evidence"):
-        te = getattr(triage_out, "technique_evidence")
-        if isinstance(te, dict):
-            return [str(k) for k in te.keys()]
-    
-    # Dict-style
-    if isinstance(triage_out, dict):
-        te = triage_out.get("technique_evidence")
-        if isinstance(te, dict):
-            return [str(k) for k in te.keys()]
-    
-    return []
+@functools.cache
+def _out_dir() -> Path:
+    """./out, created on first use and not re-checked by later nodes."""
+    out = Path("./out")
+    out.mkdir(parents=True, exist_ok=True)
+    return out
 
 
 # ========== Node 1: Triage (LLM) ==========
@@ -74,7 +81,7 @@ async def triage_node(state: InvestigationState) -> Dict[str, Any]:
     Agent 1: Triage (LLM)
     Extract technique candidates from incident text.
     """
-    print("\n🔍 [1/8] Running Triage Agent (LLM)...")
+    logger.info("🔍 [1/8] Running Triage Agent (LLM)...")
     start_time = time.time()
     
     try:
@@ -86,28 +93,16 @@ async def triage_node(state: InvestigationState) -> Dict[str, Any]:
         triage_input = TriageInput(incident_text=incident_text)
         triage_out = await triage_incident(triage_input)
         
-        # Extract technique IDs
-        technique_ids = _extract_technique_ids(triage_out)
+        # triage_incident always returns a validated TriageOutput
+        technique_evidence = triage_out.technique_evidence
+        technique_ids = list(technique_evidence)
+        summary = triage_out.summary
         
         if not technique_ids:
             raise ValueError("Triage produced no technique candidates")
         
-        # Get technique evidence (dict or empty)
-        technique_evidence = {}
-        if hasattr(triage_out, "technique_evidence"):
-            technique_evidence = getattr(triage_out, "technique_evidence") or {}
-        elif isinstance(triage_out, dict):
-            technique_evidence = triage_out.get("technique_evidence", {})
-        
-        # Get summary
-        summary = None
-        if hasattr(triage_out, "summary"):
-            summary = getattr(triage_out, "summary")
-        elif isinstance(triage_out, dict):
-            summary = triage_out.get("summary")
-        
         duration = time.time() - start_time
-        print(f"✅ Triage complete: {len(technique_ids)} candidates ({duration:.2f}s)")
+        logger.info("✅ Triage complete: %s candidates (%.2fs)", len(technique_ids), duration)
         
         return {
             "triage_summary": summary,
@@ -118,7 +113,7 @@ async def triage_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"❌ Triage failed: {e}")
+        logger.error("❌ Triage failed: %s", e)
         return add_error(state, "triage", str(e))
 
 
@@ -127,7 +122,7 @@ async def triage_node(state: InvestigationState) -> Dict[str, Any]:
 @retry_async(max_attempts=3, backoff=2.0)
 async def mapping_node(state: InvestigationState) -> Dict[str, Any]:
     """Agent 2: Mapping (MCP)"""
-    print("\n🗺️  [2/8] Running Mapping Agent (MCP)...")
+    logger.info("🗺️  [2/8] Running Mapping Agent (MCP)...")
     start_time = time.time()
     
     technique_ids = state.get("technique_ids", [])
@@ -143,7 +138,7 @@ async def mapping_node(state: InvestigationState) -> Dict[str, Any]:
             client,
             technique_ids=technique_ids,
             domain=state.get("domain", "enterprise"),
-            include_description=True,
+            include_description=False,
         )
         
         confirmed = mapping.get("confirmed_techniques", []) or []
@@ -153,10 +148,10 @@ async def mapping_node(state: InvestigationState) -> Dict[str, Any]:
             raise ValueError("No techniques confirmed by mapping agent")
         
         duration = time.time() - start_time
-        print(f"✅ Mapping complete: {len(confirmed)} techniques confirmed ({duration:.2f}s)")
+        logger.info("✅ Mapping complete: %s techniques confirmed (%.2fs)", len(confirmed), duration)
         
         if not_found:
-            print(f"⚠️  {len(not_found)} techniques not found: {', '.join(not_found)}")
+            logger.warning("⚠️  %s techniques not found: %s", len(not_found), ', '.join(not_found))
         
         return {
             "confirmed_techniques": confirmed,
@@ -165,7 +160,7 @@ async def mapping_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"❌ Mapping failed: {e}")
+        logger.error("❌ Mapping failed: %s", e)
         return add_error(state, "mapping", str(e))
 
 
@@ -177,7 +172,7 @@ async def intel_node(state: InvestigationState) -> Dict[str, Any]:
     Agent 3: Intel (MCP)
     Enrich with threat actor groups and malware.
     """
-    print("\n🕵️  [3a/8] Running Intel Agent (MCP)...")
+    logger.info("🕵️  [3a/8] Running Intel Agent (MCP)...")
     start_time = time.time()
     
     confirmed = state.get("confirmed_techniques", [])
@@ -199,7 +194,7 @@ async def intel_node(state: InvestigationState) -> Dict[str, Any]:
         
         duration = time.time() - start_time
         intel_items = len(intel.get("intel", []))
-        print(f"✅ Intel complete: {intel_items} techniques enriched ({duration:.2f}s)")
+        logger.info("✅ Intel complete: %s techniques enriched (%.2fs)", intel_items, duration)
         
         return {
             "intel": intel,
@@ -208,7 +203,7 @@ async def intel_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"❌ Intel failed: {e}")
+        logger.error("❌ Intel failed: %s", e)
         return add_error(state, "intel", str(e))
     
     # finally:
@@ -223,7 +218,7 @@ async def detection_node(state: InvestigationState) -> Dict[str, Any]:
     Agent 4: Detection (MCP)
     Get STIX data components for detection.
     """
-    print("\n🔬 [3b/8] Running Detection Agent (MCP)...")
+    logger.info("🔬 [3b/8] Running Detection Agent (MCP)...")
     start_time = time.time()
     
     confirmed = state.get("confirmed_techniques", [])
@@ -245,7 +240,7 @@ async def detection_node(state: InvestigationState) -> Dict[str, Any]:
         
         duration = time.time() - start_time
         detection_items = len(detections.get("detections", []))
-        print(f"✅ Detection complete: {detection_items} techniques analyzed ({duration:.2f}s)")
+        logger.info("✅ Detection complete: %s techniques analyzed (%.2fs)", detection_items, duration)
         
         return {
             "detections": detections,
@@ -254,7 +249,7 @@ async def detection_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"❌ Detection failed: {e}")
+        logger.error("❌ Detection failed: %s", e)
         return add_error(state, "detection", str(e))
     
     # finally:
@@ -266,7 +261,7 @@ async def detection_node(state: InvestigationState) -> Dict[str, Any]:
 @retry_async(max_attempts=1, backoff=2.0)
 async def mitigation_node(state: InvestigationState) -> Dict[str, Any]:
     """Agent 6: Mitigation (MCP) - Get ALL defensive controls for techniques."""
-    print("\n🛡️  [3c/8] Running Mitigation Agent (MCP)...")
+    logger.info("🛡️  [3c/8] Running Mitigation Agent (MCP)...")
     start_time = time.time()
     
     confirmed = state.get("confirmed_techniques", [])
@@ -293,12 +288,15 @@ async def mitigation_node(state: InvestigationState) -> Dict[str, Any]:
         with_mits = summary.get("with_mitigations", 0)
         total_techs = summary.get("total_techniques", len(confirmed))
         
-        print(f"✅ Mitigation complete: {total_mits} controls for {with_mits}/{total_techs} techniques ({duration:.2f}s)")
+        logger.info(
+            "✅ Mitigation complete: %s controls for %s/%s techniques (%.2fs)",
+            total_mits, with_mits, total_techs, duration,
+        )
         
         # Log errors if any
         errors = mitigations.get("errors", [])
         if errors:
-            print(f"⚠️  {len(errors)} errors during mitigation fetching")
+            logger.warning("⚠️  %s errors during mitigation fetching", len(errors))
         
         return {
             "mitigations": mitigations,
@@ -307,7 +305,7 @@ async def mitigation_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"❌ Mitigation failed: {e}")
+        logger.error("❌ Mitigation failed: %s", e)
         return add_error(state, "mitigation", str(e))
     
     # finally:
@@ -322,7 +320,7 @@ async def detection_reasoning_node(state: InvestigationState) -> Dict[str, Any]:
     Agent 5: Detection Reasoning (LLM)
     LLM fallback for techniques with 0 STIX data components.
     """
-    print("\n🧠 [4/8] Running Detection Reasoning Agent (LLM)...")
+    logger.info("🧠 [4/8] Running Detection Reasoning Agent (LLM)...")
     start_time = time.time()
     
     confirmed = state.get("confirmed_techniques", [])
@@ -339,11 +337,13 @@ async def detection_reasoning_node(state: InvestigationState) -> Dict[str, Any]:
             incident_text=incident_text,
             model=state.get("llm_model", "gpt-4o-mini"),
             max_hypotheses_per_technique=3,
+            mcp_client=state.get("mcp_client"),
+            domain=state.get("domain", "enterprise"),
         )
         
         duration = time.time() - start_time
         reasoning_items = len(reasoning.get("detection_reasoning", []))
-        print(f"✅ Detection Reasoning complete: {reasoning_items} techniques analyzed ({duration:.2f}s)")
+        logger.info("✅ Detection Reasoning complete: %s techniques analyzed (%.2fs)", reasoning_items, duration)
         
         return {
             "detection_reasoning": reasoning,
@@ -352,7 +352,7 @@ async def detection_reasoning_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"⚠️  Detection Reasoning failed (non-critical): {e}")
+        logger.warning("⚠️  Detection Reasoning failed (non-critical): %s", e)
         # Non-critical failure - return empty result
         return {
             "detection_reasoning": {"detection_reasoning": []},
@@ -368,7 +368,7 @@ async def visualization_node(state: InvestigationState) -> Dict[str, Any]:
     Agent 7: Visualization
     Create ATT&CK Navigator layer.
     """
-    print("\n🎨 [5/8] Running Visualization Agent...")
+    logger.info("🎨 [5/8] Running Visualization Agent...")
     start_time = time.time()
     
     confirmed = state.get("confirmed_techniques", [])
@@ -392,10 +392,10 @@ async def visualization_node(state: InvestigationState) -> Dict[str, Any]:
         )
         
         # Save to disk
-        layer_path = save_layer_json(layer, "./out/incident_layer.json")
+        layer_path = await asyncio.to_thread(save_layer_json, layer, _out_dir() / "incident_layer.json")
         
         duration = time.time() - start_time
-        print(f"✅ Visualization complete: Layer saved to {layer_path} ({duration:.2f}s)")
+        logger.info("✅ Visualization complete: Layer saved to %s (%.2fs)", layer_path, duration)
         
         return {
             "navigator_layer": layer,
@@ -405,7 +405,7 @@ async def visualization_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"❌ Visualization failed: {e}")
+        logger.error("❌ Visualization failed: %s", e)
         return add_error(state, "visualization", str(e))
     
     # finally:
@@ -414,13 +414,17 @@ async def visualization_node(state: InvestigationState) -> Dict[str, Any]:
 
 # ========== Node 8: Report (LLM) ==========
 
+# State keys the report can't be written without
+_REPORT_REQUIRED = ("triage_summary", "confirmed_techniques", "intel", "detections")
+
+
 @retry_async(max_attempts=1, backoff=2.0)
 async def report_node(state: InvestigationState) -> Dict[str, Any]:
     """
     Agent 8: Report (LLM)
     Generate executive markdown report.
     """
-    print("\n📄 [6/8] Running Report Agent (LLM)...")
+    logger.info("📄 [6/8] Running Report Agent (LLM)...")
     start_time = time.time()
     
     # Safe access to all required fields
@@ -431,19 +435,10 @@ async def report_node(state: InvestigationState) -> Dict[str, Any]:
     incident_text = state.get("incident_text", "")
     
     # Check prerequisites
-    if not triage_summary or not confirmed or not intel or not detections:
-        missing = []
-        if not triage_summary:
-            missing.append("triage_summary")
-        if not confirmed:
-            missing.append("confirmed_techniques")
-        if not intel:
-            missing.append("intel")
-        if not detections:
-            missing.append("detections")
-        
+    missing = [k for k in _REPORT_REQUIRED if not state.get(k)]
+    if missing:
         error_msg = f"Missing required data: {', '.join(missing)}"
-        print(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
         return add_error(state, "report", error_msg)
     
     try:
@@ -464,12 +459,13 @@ async def report_node(state: InvestigationState) -> Dict[str, Any]:
         markdown = report.get("markdown", "")
         
         # Save to disk
-        report_path = "./out/incident_report.md"
-        with open(report_path, "w", encoding="utf-8") as f:
-            f.write(markdown)
+        report_path = _out_dir() / "incident_report.md"
+        await asyncio.to_thread(report_path.write_text, markdown, encoding="utf-8")
         
         duration = time.time() - start_time
-        print(f"✅ Report complete: {len(markdown)} chars, saved to {report_path} ({duration:.2f}s)")
+        logger.info(
+            "✅ Report complete: %s chars, saved to %s (%.2fs)", len(markdown), report_path, duration
+        )
         
         return {
             "report": report,
@@ -479,5 +475,5 @@ async def report_node(state: InvestigationState) -> Dict[str, Any]:
         }
     
     except Exception as e:
-        print(f"❌ Report failed: {e}")
+        logger.error("❌ Report failed: %s", e)
         return add_error(state, "report", str(e))
\ No newline at end of file
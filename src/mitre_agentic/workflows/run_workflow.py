@@ -1,10 +1,12 @@
-import asyncio
 from pathlib import Path
 import logging, os
 
 from dotenv import load_dotenv
 
-from mitre_agentic.mcp_client import MitreMcpClient
+from mitre_agentic.agents.report_agent import aclose_http_client
+from mitre_agentic.mcp_client import MitreMcpPool
+from mitre_agentic.utils import aio
+from mitre_agentic.utils.logsetup import setup_queue_logging
 from mitre_agentic.workflows.state import create_initial_state
 from mitre_agentic.workflows.graph import (
     create_graph_no_checkpointing,
@@ -19,7 +21,9 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 load_dotenv()
 
 def quiet_mcp_logs():
-    logging.getLogger().setLevel(logging.WARNING)
+    setup_queue_logging(logging.WARNING)
+    # Node progress lines are INFO records on the package's own loggers
+    logging.getLogger("mitre_agentic").setLevel(logging.INFO)
 
     # clean MCP + AnyIO noise
     for name in [
@@ -51,9 +55,10 @@ async def main():
     print("MITRE ATT&CK Investigation Workflow - Basic Execution")
     print("="*80 + "\n")
     
-    # Create shared MCP client
+    # Create shared MCP client: a pool of server replicas, so the parallel
+    # intel/detection/mitigation nodes don't queue on one stdio pipe
     print("🔌 Connecting to MCP server...")
-    client = MitreMcpClient()
+    client = MitreMcpPool()
     
     try:
         # Create graph
@@ -77,7 +82,7 @@ async def main():
         print("INVESTIGATION COMPLETE")
         print("="*80)
         
-        completed = final_state.get("completed_agents", [])
+        completed = final_state.get("completed_agents", {})
         print(f"\nCompleted agents ({len(completed)}/8):")
         for agent in completed:
             print(f"   - {agent}")
@@ -90,7 +95,7 @@ async def main():
         
         timings = final_state.get("timings", {})
         if timings:
-            total_time = sum(timings.values())
+            total_time = final_state.get("total_time", 0.0)
             print(f"\n Total time: {total_time:.2f}s")
             print("\n  Agent timings:")
             for agent, duration in sorted(timings.items(), key=lambda x: x[1], reverse=True):
@@ -121,15 +126,10 @@ async def main():
     
     finally:
         print("Investigation complete, exiting...")
-        try:
-            print("Closing MCP connection...")
-            await client.close()
-        except RuntimeError as e:
-            # Suppress "cancel scope in different task"
-            if "cancel scope" not in str(e):
-                raise
-            pass
+        print("Closing MCP connection...")
+        await client.close()
+        await aclose_http_client()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    aio.run(main())
\ No newline at end of file
@@ -1,5 +1,8 @@
 
 from __future__ import annotations
+import operator
+import time
+from datetime import datetime
 from typing import Any, Dict, List, Optional, TypedDict
 from typing_extensions import Annotated
 from langgraph.graph import add_messages
@@ -33,9 +36,11 @@ class InvestigationState(TypedDict, total=False):
     report_markdown: Optional[str]
     
     # ========== Metadata ==========
-    completed_agents: Annotated[List[str], lambda x, y: x + y]
+    # agent name -> completion time; dict keeps finish order, dedupes retries
+    completed_agents: Annotated[Dict[str, float], merge_dicts]
     errors: Annotated[List[Dict[str, str]], lambda x, y: x + y]
     timings: Annotated[Dict[str, float], merge_dicts]  # ← Merge dicts
+    total_time: Annotated[float, operator.add]  # running sum of timings
     domain: str
     llm_model: str
 
@@ -59,9 +64,10 @@ def create_initial_state(
         detections={},
         detection_reasoning={},
         mitigations={},
-        completed_agents=[],
+        completed_agents={},
         errors=[],
         timings={},
+        total_time=0.0,
     )
 
 # Some utility functions for updating state
@@ -75,7 +81,7 @@ def add_error(
         "errors": [{
             "agent": agent_name,
             "error": error,
-            "timestamp": __import__("datetime").datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat()
         }]
     }
 
@@ -86,7 +92,7 @@ def mark_agent_complete(
 ) -> Dict[str, Any]:
     """Mark an agent as completed."""
     return {
-        "completed_agents": [agent_name]
+        "completed_agents": {agent_name: time.time()}
     }
 
 
@@ -95,7 +101,5 @@ def add_timing(
     agent_name: str,
     duration: float
 ) -> Dict[str, Any]:
-    """Add timing information."""
-    timings = state.get("timings", {}).copy()
-    timings[agent_name] = duration
-    return {"timings": timings}
\ No newline at end of file
+    """Add timing information (deltas: the reducers merge/sum them into state)."""
+    return {"timings": {agent_name: duration}, "total_time": duration}
\ No newline at end of file
@@ -3,7 +3,58 @@
 Visualize the LangGraph workflow structure.
 """
 
-from mitre_agentic.workflows.graph import create_graph_no_checkpointing
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from mitre_agentic.utils import jsonutil
+
+# Node/edge lists and Mermaid text only change when graph.py does: cache them
+# keyed on its mtime so repeat runs skip importing and compiling the graph.
+_GRAPH_SOURCE = Path(__file__).with_name("graph.py")
+_CACHE_PATH = Path("./out/.graph_cache.json")
+
+
+def _load_cached(mtime: float) -> Optional[Dict[str, Any]]:
+    try:
+        cached = jsonutil.loads(_CACHE_PATH.read_bytes())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("mtime") != mtime:
+        return None
+    return cached
+
+
+def _build_snapshot(mtime: float) -> Dict[str, Any]:
+    from mitre_agentic.workflows.graph import create_graph_no_checkpointing
+
+    drawable = create_graph_no_checkpointing().get_graph()
+
+    edges = []
+    for edge in drawable.edges:
+        # Edge can be tuple of (source, target) or (source, target, data)
+        if isinstance(edge, tuple):
+            source = edge[0]
+            target = edge[1] if len(edge) > 1 else "?"
+            conditional = len(edge) > 2 and isinstance(edge[2], dict) and "data" in edge[2]
+            edges.append([source, target, conditional])
+        else:
+            edges.append([str(edge), None, False])
+
+    snapshot: Dict[str, Any] = {"mtime": mtime, "nodes": list(drawable.nodes), "edges": edges}
+    try:
+        snapshot["mermaid"] = drawable.draw_mermaid()
+    except Exception as e:
+        snapshot["mermaid"] = None
+        snapshot["mermaid_error"] = str(e)
+        return snapshot  # don't cache a partial snapshot
+
+    try:
+        _CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _CACHE_PATH.write_text(jsonutil.dumps(snapshot), encoding="utf-8")
+    except OSError:
+        pass
+    return snapshot
 
 
 def main():
@@ -12,14 +63,15 @@ def main():
     print("MITRE ATT&CK Investigation Workflow - Graph Visualization")
     print("="*80 + "\n")
     
-    # Create graph
-    graph = create_graph_no_checkpointing()
+    # Create graph (or reuse the cached structure)
+    mtime = os.stat(_GRAPH_SOURCE).st_mtime
+    snapshot = _load_cached(mtime) or _build_snapshot(mtime)
     
     # Get graph structure
     print("Workflow Graph Structure:\n")
     
     # Print nodes
-    nodes = list(graph.get_graph().nodes)
+    nodes = snapshot["nodes"]
     print(f"Nodes ({len(nodes)}):")
     for i, node in enumerate(nodes, 1):
         if node == "__start__":
@@ -29,49 +81,40 @@ def main():
         else:
             print(f"  {i}. {node}")
     
-    # Print edges (handle different edge formats)
-    edges = list(graph.get_graph().edges)
+    # Print edges
+    edges = snapshot["edges"]
     print(f"\nEdges ({len(edges)}):")
-    for edge in edges:
-        # Edge can be tuple of (source, target) or (source, target, data)
-        if isinstance(edge, tuple):
-            source = edge[0]
-            target = edge[1] if len(edge) > 1 else "?"
-            
-            # Clean up names
-            if source == "__start__":
-                source = "START"
-            if target == "__end__":
-                target = "END"
-            
-            # Check if it's a conditional edge
-            if len(edge) > 2 and isinstance(edge[2], dict):
-                edge_data = edge[2]
-                if "data" in edge_data:
-                    print(f"  {source} → {target} [conditional]")
-                else:
-                    print(f"  {source} → {target}")
-            else:
-                print(f"  {source} → {target}")
+    for source, target, conditional in edges:
+        if target is None:
+            print(f"  {source}")
+            continue
+        
+        # Clean up names
+        if source == "__start__":
+            source = "START"
+        if target == "__end__":
+            target = "END"
+        
+        if conditional:
+            print(f"  {source} → {target} [conditional]")
         else:
-            print(f"  {edge}")
+            print(f"  {source} → {target}")
     
     # Generate Mermaid diagram
     print("\n" + "="*80)
     print("Mermaid Diagram (paste into https://mermaid.live/):")
     print("="*80 + "\n")
     
-    try:
-        mermaid = graph.get_graph().draw_mermaid()
+    mermaid = snapshot.get("mermaid")
+    if mermaid is not None:
         print(mermaid)
         
         # Save to file
         with open("./out/workflow_graph.mmd", "w") as f:
             f.write(mermaid)
         print("\n Mermaid diagram saved to: out/workflow_graph.mmd")
-        
-    except Exception as e:
-        print(f"Could not generate Mermaid: {e}")
+    else:
+        print(f"Could not generate Mermaid: {snapshot.get('mermaid_error')}")
     
     # ASCII diagram
     print("\n" + "="*80)